@@ -1,6 +1,9 @@
+import functools
+import io
+import os
 import re
-import sys
-from typing import Optional, Union
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional, TextIO, Union
 
 re_entity = re.compile(r"^\s*entity\s+([A-Za-z_][A-Za-z0-9_]+)\s+is\s*$", re.IGNORECASE)
 re_proc = re.compile(r"^\s*process\s*\(", re.IGNORECASE)
@@ -14,21 +17,72 @@ re_else = re.compile(r"^\s*else", re.IGNORECASE)
 re_elsif = re.compile(r"^\s*elsif\s*\((.*)\)\s*then", re.IGNORECASE)
 re_endif = re.compile(r"^\s*end\s+if;", re.IGNORECASE)
 re_state_next = re.compile(r"^\s*state_next\s*<=\s*([A-Za-z_][A-Za-z0-9_]*)", re.IGNORECASE)
+re_signal_is_high = re.compile(r"^\s*([A-Za-z_][A-Za-z0-9_]*)\s*=\s*'1'\s*$")
+re_not_identifier = re.compile(r"[^A-Za-z0-9_]+")
 
-_states_by_name: dict[str, any] = {}
+# the transition of next state assignments that aren't in any if/elsif branch (unconditional or else), named to match
+# the FSMs editor, where transitions without any letters are the unconditional transitions
+DEFAULT_TRANSITION = "__"
+
+
+class VhdlParseError(ValueError):
+    """ The VHDL couldn't be parsed as a state machine. """
+
+# All of the line patterns above that the parser acts on, as one alternation, so that each line is classified with a
+# single match. The patterns are mutually exclusive, and the name of the matched group is the kind of line.
+re_line = re.compile(r"""^\s*(?:
+      (?P<proc>process\s*\()
+    | (?P<endproc>end\s+process\s*;)
+    | (?P<if>if\s+\((?P<if_condition>.*)\)\s*then)
+    | (?P<else>else)
+    | (?P<elsif>elsif\s*\((?P<elsif_condition>.*)\)\s*then)
+    | (?P<endif>end\s+if;)
+    | (?P<state>when\ (?P<state_name>[A-Za-z_][A-Za-z0-9_]+)\s*=>)
+    | (?P<end_case>end\s+case\s*;)
+    | (?P<case_state_machine>case\s+state_reg\s+is)
+    | (?P<entity>entity\s+(?P<entity_name>[A-Za-z_][A-Za-z0-9_]+)\s+is\s*$)
+)""", re.IGNORECASE | re.VERBOSE)
+
+# read buffer size for the vhdl files
+_read_buffer_size = 1 << 20
+
+@functools.lru_cache(maxsize=None)
+def _indent(indent: int) -> str:
+    """ The prefix of lines at the given indent level while printing. Cached, and safe to call from any thread. """
+    return "   " * indent
 
 
 class SVal:
-    def __init__(self, strval: str):
-        self.orig_strval: str = strval
-        self.strval: str = strval.strip()
+    """ A run of static (non-conditional) lines. Lines are only ever appended, and each line is scanned for a next
+    state once, when it is appended, so that building up a long run takes linear time. """
+
+    def __init__(self, strval: str, states_by_name: dict[str, 'State']):
+        self.parts: list[str] = []
+        self.states_by_name: dict[str, State] = states_by_name
         self.next_states: dict[str, State] = {}
+        self.append(strval)
 
+    def append(self, strval: str) -> list[str]:
+        """ Appends the static text, and returns the names of the next states that it assigns. """
+        self.parts.append(strval)
+        next_state_names = []
         for line in strval.splitlines():
             m = re_state_next.match(line)
             if m is not None:
                 next_state_name = m.groups()[0]
-                self.next_states[next_state_name] = State.get_state(next_state_name)
+                self.next_states[next_state_name] = self.states_by_name.get(next_state_name)
+                next_state_names.append(next_state_name)
+        return next_state_names
+
+    @property
+    def orig_strval(self) -> str:
+        if len(self.parts) > 1:
+            self.parts = ["".join(self.parts)]
+        return self.parts[0]
+
+    @property
+    def strval(self) -> str:
+        return self.orig_strval.strip()
 
     def is_conditional(self):
         return False
@@ -36,35 +90,32 @@ class SVal:
     def next_states(self):
         return self.next_states
 
-    def __add__(self, other):
-        if isinstance(other, str):
-            return SVal(self.orig_strval + other)
-        elif isinstance(other, SVal):
-            return SVal(self.orig_strval + other.orig_strval)
-        else:
-            return SVal(self.orig_strval + str(other))
-
     def __str__(self):
         return self.strval
 
 
 class StateMachine:
-    def __init__(self, parent: Optional['StateMachine']):
+    def __init__(self, parent: Optional['StateMachine'], states_by_name: dict[str, 'State'] = None):
+        """ states_by_name is the registry of all the states in the same program, shared with the parent if not given. """
         self.parent: Optional[Union['Conditional', 'State']] = parent
+        self.states_by_name: dict[str, State] = states_by_name if (states_by_name is not None) else parent.states_by_name
         self.next_states: dict[str, Optional['State']] = {}
 
+    def get_state(self, state_name: str) -> Optional['State']:
+        return self.states_by_name.get(state_name)
+
     def get_states(self) -> dict[str, 'State']:
         state_names = list(self.next_states.keys())
         for state_name in state_names:
             if self.next_states[state_name] is None:
-                self.next_states[state_name] = State.get_state(state_name)
+                self.next_states[state_name] = self.get_state(state_name)
         return self.next_states
 
     def add_next_state(self, next_state_name: str) -> 'State':
         if next_state_name in self.next_states:
             return self.next_states[next_state_name]
 
-        state: Optional['State'] = State.get_state(next_state_name)
+        state: Optional['State'] = self.get_state(next_state_name)
         self.next_states[next_state_name] = state
         if self.parent is not None:
             self.parent.add_next_state(next_state_name)
@@ -72,8 +123,8 @@ class StateMachine:
 
 
 class Content(StateMachine):
-    def __init__(self, parent: Optional[Union['Conditional', 'State']]):
-        super().__init__(parent)
+    def __init__(self, parent: Optional[Union['Conditional', 'State']], states_by_name: dict[str, 'State'] = None):
+        super().__init__(parent, states_by_name)
         self.contents: list[Union[SVal, 'Conditional']] = []
 
     def append(self, static_or_conditional: Union[str, 'Conditional']) -> 'Content':
@@ -89,39 +140,56 @@ class Content(StateMachine):
                 sval: static_or_conditional = static_or_conditional
                 static = sval.orig_strval
 
-            m_next_state = re_state_next.match(static)
-            if m_next_state:
-                next_state_name = m_next_state.groups()[0]
-                self.add_next_state(next_state_name)
-
             prev_is_static = len(self.contents) > 0 and isinstance(self.contents[-1], SVal)
             if prev_is_static:
-                self.contents[-1] += static
+                sval: SVal = self.contents[-1]
+                next_state_names = sval.append(static)
             else:
-                self.contents.append(SVal(static))
+                sval = SVal(static, self.states_by_name)
+                next_state_names = list(sval.next_states)
+                self.contents.append(sval)
+
+            for next_state_name in next_state_names:
+                self.add_next_state(next_state_name)
 
         return self
 
     def print(self, indent: int):
-        ret = ""
-        sindent: str = "   " * indent
+        fout = io.StringIO()
+        self.write(fout, indent)
+        return fout.getvalue()
+
+    def write(self, fout: TextIO, indent: int):
+        """ Writes the same text that print() returns to fout. """
+        sindent: str = _indent(indent)
+        wrote_any = False
         for content in self.contents:
-            if ret != "":
-                ret += "\n"
+            if wrote_any:
+                fout.write("\n")
             if content.is_conditional():
                 conditional: Conditional = content
-                ret += conditional.print(indent)
+                conditional.write(fout, indent)
+                wrote_any = True
             else:
                 static: SVal = content
                 lines = [l.strip() for l in static.orig_strval.splitlines()]
-                ret += sindent + ("\n" + sindent).join(lines)
-        return ret
+                sstatic = sindent + ("\n" + sindent).join(lines)
+                fout.write(sstatic)
+                wrote_any = wrote_any or (sstatic != "")
 
-    def __add__(self, other):
-        if isinstance(other, str) or isinstance(other, Conditional) or isinstance(other, SVal):
-            return self.append(other)
-        else:
-            raise RuntimeError(f"Trying to add {other} of type {type(other)} to Content")
+    def collect_transitions(self, condition: Optional[str], transitions: dict[str, str]):
+        """ Adds the next state of every state_next assignment in this content to transitions, keyed by the condition
+        that it is assigned under. Later assignments under the same condition win, as in VHDL. """
+        for content in self.contents:
+            if content.is_conditional():
+                conditional: Conditional = content
+                conditional.collect_transitions(condition, transitions)
+            else:
+                static: SVal = content
+                for line in static.orig_strval.splitlines():
+                    m = re_state_next.match(line)
+                    if m is not None:
+                        transitions[condition if (condition is not None) else DEFAULT_TRANSITION] = m.groups()[0]
 
 
 class Conditional(StateMachine):
@@ -144,12 +212,12 @@ class Conditional(StateMachine):
         return self
 
     def append_trueval(self, trueval: Union[str, 'Conditional']):
-        self.trueval += trueval
+        self.trueval.append(trueval)
 
     def append_falseval(self, falseval: Union[str, 'Conditional']):
         if not self.has_false():
             self.falseval = Content(self)
-        self.falseval += falseval
+        self.falseval.append(falseval)
 
     def append_elsifval(self, elsifval: 'Conditional'):
         self.elsifval = elsifval
@@ -167,99 +235,113 @@ class Conditional(StateMachine):
         return self.falseval
 
     def print(self, indent: int):
-        sindent = "   " * indent
+        fout = io.StringIO()
+        self.write(fout, indent)
+        return fout.getvalue()
+
+    def write(self, fout: TextIO, indent: int):
+        """ Writes the same text that print() returns to fout. """
+        sindent = _indent(indent)
         if self.is_elsif:
-            ret = f"{sindent}elsif ({self.condition}) then\n"
+            fout.write(f"{sindent}elsif ({self.condition}) then\n")
         else:
-            ret = f"{sindent}if ({self.condition}) then\n"
-        ret += self.trueval.print(indent + 1) + "\n"
+            fout.write(f"{sindent}if ({self.condition}) then\n")
+        self.trueval.write(fout, indent + 1)
+        fout.write("\n")
 
         if self.has_elsif():
-            ret += self.elsifval.print(indent)
+            self.elsifval.write(fout, indent)
         elif self.has_false():
-            ret += f"{sindent}else\n"
-            ret += self.falseval.print(indent + 1) + "\n"
-            ret += f"{sindent}end if;"
-        else:
-            ret += f"{sindent}end if;"
-        return ret
-
-    def __add__(self, other):
-        if isinstance(other, str) or isinstance(other, Conditional) or isinstance(other, SVal):
-            return self.append(other)
+            fout.write(f"{sindent}else\n")
+            self.falseval.write(fout, indent + 1)
+            fout.write(f"\n{sindent}end if;")
         else:
-            raise RuntimeError(f"Trying to add {other} of type {type(other)} to Conditional")
+            fout.write(f"{sindent}end if;")
+
+    def condition_name(self) -> str:
+        """ The condition as a transition name: just the signal for "signal = '1'", otherwise the whole condition. """
+        m = re_signal_is_high.match(self.condition)
+        return m.groups()[0] if (m is not None) else self.condition
+
+    def collect_transitions(self, condition: Optional[str], transitions: dict[str, str]):
+        """ Walks the if/elsif/else chain, see Content.collect_transitions(). The conditions of nested branches are
+        joined with "and", and else branches keep the condition of the enclosing branch. """
+        name = self.condition_name()
+        self.trueval.collect_transitions(name if (condition is None) else f"{condition} and {name}", transitions)
+        if self.has_elsif():
+            self.elsifval.collect_transitions(condition, transitions)
+        elif self.has_false():
+            self.falseval.collect_transitions(condition, transitions)
 
 
 class State(Content):
-    def __init__(self, name: str):
-        super().__init__(None)
+    def __init__(self, name: str, states_by_name: dict[str, 'State']):
+        super().__init__(None, states_by_name)
         self.name: str = name.strip()
-        _states_by_name[name] = self
+        states_by_name[name] = self
 
-    @classmethod
-    def get_states(cls):
-        return _states_by_name
+    def get_states(self) -> dict[str, 'State']:
+        return self.states_by_name
 
-    @classmethod
-    def get_state(cls, state_name: str):
-        if state_name not in _states_by_name:
-            return None
-        return _states_by_name[state_name]
+    def get_transitions_by_condition(self) -> dict[str, str]:
+        """ The next state for each transition condition out of this state, in the order that they're checked. """
+        transitions: dict[str, str] = {}
+        self.collect_transitions(None, transitions)
+        return transitions
 
     def get_transition_conditions(self) -> list[str]:
-        ret = []
-        next_transition = "__" # TODO get the actual transition strings
-        for state_name, state in self.next_states.items():
-            ret.append(next_transition)
-            next_transition += "_"
-        return ret
-
-    def get_transitions(self, transition_conditions) -> list[str]:
-        ret = list(self.next_states.keys())
-        for i in range(len(ret)+1, len(transition_conditions)+1):
-            ret.append("")
-        return ret
-
-    def print(self, indent):
-        sindent = "   " * indent
-        ret = f"{sindent}when {self.name} =>\n"
-        ret += super().print(indent + 1)
-        return ret
+        return list(self.get_transitions_by_condition().keys())
+
+    def get_transitions(self, transition_conditions: list[str]) -> list[str]:
+        """ The next state for each of the given conditions, "" for the conditions that don't leave this state. """
+        transitions = self.get_transitions_by_condition()
+        return [transitions.get(condition, "") for condition in transition_conditions]
+
+    def write(self, fout: TextIO, indent: int):
+        """ Writes the same text that print() returns to fout. """
+        fout.write(f"{_indent(indent)}when {self.name} =>\n")
+        super().write(fout, indent + 1)
 
 
 class Program():
-    def __init__(self, filename: str):
+    def __init__(self, filename: Union[str, TextIO]):
+        """ Parses the state machine from the given .vhd file, or from an open text stream. """
         self.states: dict[str, State] = {}
+        self.states_by_name: dict[str, State] = {} # every state that has been declared so far, including the current one
         self.entity_name = "FSM"
 
-        with open(filename, "r") as fin:
-
-            # process all the lines in the first combination process to
-            lineno = 1
-            dval: dict[str:any] = {
-                "entity_declared": False,
-                "entity_name": "",
-                "in_proc": False,
-                "in_combinational": False,
-                "in_state_machine": False,
-                "state": None,
-                "conditional": None,
-            }
-            for line in fin:
-                try:
-                    done, state = self._process_combination(line, lineno, dval)
-                except Exception:
-                    print(f"Error encountered while processing line {lineno}:\n\"{line}\"", file=sys.stderr)
-                    raise
-                if state is not None:
-                    self.states[state.name] = state
-
-                lineno += 1
-                if done:
-                    if dval["entity_declared"]:
-                        self.entity_name = dval["entity_name"]
-                    break
+        if not isinstance(filename, str):
+            self._parse(filename)
+            return
+        buffer_size = min(_read_buffer_size, os.path.getsize(filename) + 1)
+        with open(filename, "r", buffering=buffer_size) as fin:
+            self._parse(fin)
+
+    def _parse(self, fin: TextIO):
+        # process all the lines in the first combination process to
+        lineno = 1
+        dval: dict[str:any] = {
+            "entity_declared": False,
+            "entity_name": "",
+            "in_proc": False,
+            "in_combinational": False,
+            "in_state_machine": False,
+            "state": None,
+            "conditional": None,
+        }
+        for line in fin:
+            try:
+                done, state = self._process_combination(line, lineno, dval)
+            except Exception as ex:
+                raise VhdlParseError(f"Error encountered while processing line {lineno} \"{line.strip()}\": {ex}") from ex
+            if state is not None:
+                self.states[state.name] = state
+
+            lineno += 1
+            if done:
+                if dval["entity_declared"]:
+                    self.entity_name = dval["entity_name"]
+                break
 
     def _process_combination(self, line: str, lineno: int, dval: dict[str:any]) -> tuple[bool, Optional[State]]:
         curr_state: State = dval["state"]
@@ -267,11 +349,14 @@ class Program():
         if sline == "":
             sline = line
 
-        if re_proc.match(sline):
+        m_line = re_line.match(sline)
+        kind = m_line.lastgroup if (m_line is not None) else None
+
+        if kind == "proc":
             dval["in_proc"] = True
             if re_sequential.match(sline) is None:
                 dval["in_combinational"] = True
-        elif re_endproc.match(sline):
+        elif kind == "endproc":
             if dval["in_combinational"]:
                 return True, curr_state
             dval["in_state_machine"] = False
@@ -281,48 +366,25 @@ class Program():
             dval["in_combinational"] = False
         elif dval["in_combinational"]:
             if dval["in_state_machine"]:
-                m_if = re_if.match(sline)
-                m_else = re_else.match(sline)
-                m_elsif = re_elsif.match(sline)
-                m_endif = re_endif.match(sline)
-                m_state = re_state.match(sline)
-                m_end_case = re_end_case.match(sline)
-
-                def get_conditional() -> Conditional:
-                    if dval["conditional"] is None:
-                        raise RuntimeError('Error at line ' + lineno + '. Not in a conditional! ' + line.strip())
-                    return dval["conditional"]
-
-                def append_lineval(lineval: str | Conditional):
-                    if dval["conditional"] is not None:
-                        conditional: Conditional = dval["conditional"]
-                        conditional += lineval
-                    else:
-                        if dval["state"] is not None:
-                            dval["state"] += lineval
-
-                    if isinstance(lineval, Conditional):
-                        dval["conditional"] = lineval
-
-                if m_if:
+                if kind == "if":
                     parent = curr_state if (dval["conditional"] is None) else dval["conditional"]
-                    append_lineval(Conditional(parent, m_if.groups()[0]))
-                elif m_else:
-                    conditional: Conditional = get_conditional()
+                    self._append_lineval(dval, Conditional(parent, m_line.group("if_condition")))
+                elif kind == "else":
+                    conditional: Conditional = self._get_conditional(dval, line, lineno)
                     conditional.append_falseval("")
-                elif m_elsif:
-                    conditional: Conditional = get_conditional()
-                    elsifval = Conditional(conditional.parent, m_elsif.groups()[0], is_elsif=True)
+                elif kind == "elsif":
+                    conditional: Conditional = self._get_conditional(dval, line, lineno)
+                    elsifval = Conditional(conditional.parent, m_line.group("elsif_condition"), is_elsif=True)
                     conditional.append_elsifval(elsifval)
                     dval["conditional"] = elsifval
-                elif m_endif:
-                    conditional: Conditional = get_conditional()
+                elif kind == "endif":
+                    conditional: Conditional = self._get_conditional(dval, line, lineno)
                     parent = conditional.parent
                     dval["conditional"] = parent if (isinstance(parent, Conditional)) else None
-                elif m_state:
-                    dval["state"] = State(m_state.groups()[0])
+                elif kind == "state":
+                    dval["state"] = State(m_line.group("state_name"), self.states_by_name)
                     return False, curr_state
-                elif m_end_case:
+                elif kind == "end_case":
                     dval["in_state_machine"] = False
                     dval["state"] = None
                     dval["conditional"] = None
@@ -330,47 +392,136 @@ class Program():
                     dval["in_combinational"] = False
                     return True, curr_state
                 else:
-                    append_lineval(sline)
+                    self._append_lineval(dval, sline)
 
             else:  # if dval["in_state_machine"]
-                m_case_state_machine = re_case_state_machine.match(sline)
-
-                if m_case_state_machine:
+                if kind == "case_state_machine":
                     dval["in_state_machine"] = True
-        elif re_entity.match(sline):
+        elif kind == "entity":
             if not dval["entity_declared"]:
-                dval["entity_name"] = re_entity.match(sline).groups()[0]
+                dval["entity_name"] = m_line.group("entity_name")
             dval["entity_declared"] = True
         else:
             pass
 
         return False, None
 
-    def get_fsm_table(self) -> str:
-        ret = "{'fsm_name': '" + self.entity_name + "', 'table_vals': ["
-        state_strs: list[str] = []
-        transition_conditions: list[str] = []
-
-        for state_name, state in self.states.items():
-            transition_conditions += state.get_transition_conditions()
-        transition_conditions = list(sorted(set(transition_conditions)))
+    @staticmethod
+    def _get_conditional(dval: dict[str:any], line: str, lineno: int) -> Conditional:
+        if dval["conditional"] is None:
+            raise RuntimeError(f"Error at line {lineno}. Not in a conditional! {line.strip()}")
+        return dval["conditional"]
+
+    @staticmethod
+    def _append_lineval(dval: dict[str:any], lineval: str | Conditional):
+        if dval["conditional"] is not None:
+            conditional: Conditional = dval["conditional"]
+            conditional.append(lineval)
+        else:
+            if dval["state"] is not None:
+                dval["state"].append(lineval)
+
+        if isinstance(lineval, Conditional):
+            dval["conditional"] = lineval
+
+    def get_fsm_table_vals(self) -> dict[str, Union[str, list[list[str]]]]:
+        """ The state machine as the {'fsm_name': ..., 'table_vals': [[...], ...]} table that the FSMs editor's
+        parse_table() accepts. Every distinct transition condition gets one column, in the order they're first seen. """
+        condition_index: dict[str, int] = {}
+        transition_names: list[str] = []
+        state_transitions: list[tuple[str, dict[str, str]]] = []
         for state_name, state in self.states.items():
-            state_strs.append("'" + state_name + "', '" + "', '".join(state.get_transitions(transition_conditions)) + "'")
-
-        print(transition_conditions)
-        ret += "['', '" + "', '".join(transition_conditions) + "'], "
-        ret += "[" + "], [".join(state_strs) + "]"
-        ret += "]}"
+            transitions = state.get_transitions_by_condition()
+            for condition in transitions:
+                if condition not in condition_index:
+                    condition_index[condition] = len(condition_index)
+                    transition_names.append(self._transition_name(condition, transition_names))
+            state_transitions.append((state_name, transitions))
+
+        table_vals = [[""] + transition_names]
+        for state_name, transitions in state_transitions:
+            row = [state_name] + [""] * len(condition_index)
+            for condition, next_state in transitions.items():
+                row[condition_index[condition] + 1] = next_state
+            table_vals.append(row)
+        return {'fsm_name': self.entity_name, 'table_vals': table_vals}
+
+    @staticmethod
+    def _transition_name(condition: str, taken: list[str]) -> str:
+        """ The FSMs editor only accepts identifiers of at least two characters as transition names (anything else is the
+        unconditional transition), eg "count > 3" becomes "count_3" and "x" becomes "c_x". """
+        name = re_not_identifier.sub("_", condition).strip("_")
+        if condition == DEFAULT_TRANSITION:
+            name = condition
+        elif len(name) < 2 or name[0].isdigit():
+            name = "c_" + name
+        unique_name, i = name, 2
+        while unique_name in taken:
+            unique_name, i = f"{name}_{i}", i + 1
+        return unique_name
 
-        return ret
+    def get_fsm_table(self) -> str:
+        return str(self.get_fsm_table_vals())
 
     def print(self, indent: int = 0) -> str:
-        ret = ""
-        for state_name, state in self.states.items():
-            if ret != "":
-                ret += "\n"
-            ret += state.print(indent)
-        return ret
+        fout = io.StringIO()
+        self.write(fout, indent)
+        return fout.getvalue()
+
+    def write(self, fout: TextIO, indent: int = 0):
+        """ Writes the pretty-printed state machine to fout (eg a file, so that large programs are streamed to disk
+        instead of being built up in memory). Every level of the state machine writes to the same fout. """
+        for idx, state in enumerate(self.states.values()):
+            if idx > 0:
+                fout.write("\n")
+            state.write(fout, indent)
+
+
+def fsm_table_from_vhdl(vhdl: str) -> dict[str, Union[str, list[list[str]]]]:
+    """ Parses the given VHDL text, and returns its state machine as a table, see Program.get_fsm_table_vals(). Raises a
+    VhdlParseError if the text can't be parsed or doesn't have a state machine. """
+    program = Program(io.StringIO(vhdl))
+    if len(program.states) == 0:
+        raise VhdlParseError("No state machine found, expected a \"case state_reg is\" in a combinational process")
+    return program.get_fsm_table_vals()
+
+
+def _parse_file(filename: str) -> tuple[Optional[Program], Optional[str]]:
+    try:
+        return Program(filename), None
+    except (VhdlParseError, OSError, UnicodeDecodeError) as ex:
+        return None, f"{type(ex).__name__}: {ex}"
+
+
+def parse_directory(dirname: str, max_workers: int = None,
+                    use_processes: bool = True) -> tuple[dict[str, Program], dict[str, str]]:
+    """ Parses every .vhd/.vhdl file under the given directory (recursively) concurrently.
+
+    Returns one Program per file that could be parsed, and the error of every file that couldn't, both keyed by the
+    file's path relative to dirname. Parsing is CPU bound, so files are parsed in a process pool by default (every
+    Program is pickled back). Set use_processes to False to parse in a thread pool instead, which only helps when the
+    files are slow to read (eg on a network drive).
+    """
+    filenames = []
+    for root, dirs, files in os.walk(dirname):
+        dirs.sort()
+        for filename in sorted(files):
+            if os.path.splitext(filename)[1].lower() in (".vhd", ".vhdl"):
+                filenames.append(os.path.join(root, filename))
+
+    programs: dict[str, Program] = {}
+    errors: dict[str, str] = {}
+    executor_type = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    # send the files to the processes in batches, instead of one round trip per file
+    chunksize = max(1, len(filenames) // ((max_workers or os.cpu_count() or 1) * 4))
+    with executor_type(max_workers=max_workers) as executor:
+        for filename, (program, error) in zip(filenames, executor.map(_parse_file, filenames, chunksize=chunksize)):
+            relpath = os.path.relpath(filename, dirname)
+            if error is None:
+                programs[relpath] = program
+            else:
+                errors[relpath] = error
+    return programs, errors
 
 
 if __name__ == "__main__":
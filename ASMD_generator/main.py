@@ -1,12 +1,25 @@
-import pyperclip
+import argparse
+import sys
 
 from Program import Program
 
 if __name__ == "__main__":
-    program = Program("C:/Users/gladc/Documents/School/UNM/ECE_522_codesign/current_lab/vhdl/Histo.vhd")
-    sval = program.print(3)
-    pyperclip.copy(sval)
+    parser = argparse.ArgumentParser(description="Pretty-print the state machine of a VHDL file, and its FSM table.")
+    parser.add_argument("filename", help="the .vhd file to read")
+    parser.add_argument("-o", "--output", default="-", help="file to write the state machine to (\"-\" for stdout)")
+    parser.add_argument("--indent", type=int, default=3, help="indent level of the printed state machine")
+    args = parser.parse_args()
+
+    program = Program(args.filename)
+
+    # stream the state machine straight to its destination, instead of building it up in memory
+    if args.output == "-":
+        program.write(sys.stdout, args.indent)
+        sys.stdout.write("\n")
+    else:
+        with open(args.output, "w") as fout:
+            program.write(fout, args.indent)
+            fout.write("\n")
 
     fsm_str = program.get_fsm_table()
-    print(fsm_str)
-    pyperclip.copy(fsm_str)
\ No newline at end of file
+    print(fsm_str, file=sys.stderr if args.output == "-" else sys.stdout)
@@ -0,0 +1,110 @@
+import io
+import os
+import tempfile
+from unittest import TestCase
+
+from ASMD_generator.Program import Program, VhdlParseError, fsm_table_from_vhdl, parse_directory
+from FSMs.lib.fsm import parse_table
+
+
+def vhdl_with_states(states: str) -> str:
+    return ("entity door is\n"
+            "end door;\n"
+            "architecture rtl of door is\n"
+            "begin\n"
+            "   process(state_reg, open_btn)\n"
+            "   begin\n"
+            "      state_next <= state_reg;\n"
+            "      case state_reg is\n"
+            f"{states}"
+            "      end case;\n"
+            "   end process;\n"
+            "end rtl;\n")
+
+
+class Test(TestCase):
+    def test_if_elsif_else(self):
+        vhdl = vhdl_with_states("         when closed =>\n"
+                                "            if (open_btn = '1') then\n"
+                                "               state_next <= opening;\n"
+                                "            elsif (lock = '1') then\n"
+                                "               state_next <= locked;\n"
+                                "            else\n"
+                                "               state_next <= closed;\n"
+                                "            end if;\n"
+                                "         when opening =>\n"
+                                "            state_next <= closed;\n"
+                                "         when locked =>\n"
+                                "            if (key /= \"0000\") then\n"
+                                "               state_next <= closed;\n"
+                                "            end if;\n")
+        self.assertEqual({'fsm_name': 'door', 'table_vals': [
+            ['',        'open_btn', 'lock',   '__',     'key_0000'],
+            ['closed',  'opening',  'locked', 'closed', ''],
+            ['opening', '',         '',       'closed', ''],
+            ['locked',  '',         '',       '',       'closed'],
+        ]}, fsm_table_from_vhdl(vhdl))
+
+    def test_nested_conditions(self):
+        vhdl = vhdl_with_states("         when opening =>\n"
+                                "            if (sensor = '1') then\n"
+                                "               if (timer > 3) then\n"
+                                "                  state_next <= opened;\n"
+                                "               else\n"
+                                "                  state_next <= closing;\n"
+                                "               end if;\n"
+                                "            end if;\n"
+                                "         when opened =>\n"
+                                "            state_next <= closing;\n")
+        transitions = Program(io.StringIO(vhdl)).states["opening"].get_transitions_by_condition()
+        self.assertEqual({"sensor and timer > 3": "opened", "sensor": "closing"}, transitions)
+        self.assertEqual(['', 'sensor_and_timer_3', 'sensor', '__'], fsm_table_from_vhdl(vhdl)['table_vals'][0])
+
+    def test_transition_names(self):
+        vhdl = vhdl_with_states("         when idle =>\n"
+                                "            if (x = '1') then\n"
+                                "               state_next <= work;\n"
+                                "            end if;\n"
+                                "         when work =>\n"
+                                "            if (count_3 = '1') then\n"
+                                "               state_next <= idle;\n"
+                                "            elsif (count > 3) then\n"
+                                "               state_next <= idle;\n"
+                                "            elsif (x = '0') then\n"
+                                "               state_next <= work;\n"
+                                "            end if;\n")
+        table = fsm_table_from_vhdl(vhdl)
+        self.assertEqual(['', 'c_x', 'count_3', 'count_3_2', 'x_0'], table['table_vals'][0])
+
+        # every column must survive parse_table, or its transitions would become unconditional
+        fsm = parse_table(table)
+        self.assertEqual(table['table_vals'][0][1:], fsm.column_transitions())
+        idle, work = fsm.state_index["idle"], fsm.state_index["work"]
+        self.assertEqual([(fsm.transition_index["c_x"], work)], list(fsm.transitions_from(idle)))
+
+    def test_parse_errors(self):
+        with self.assertRaises(VhdlParseError) as cm:
+            fsm_table_from_vhdl(vhdl_with_states("         when idle =>\n"
+                                                 "            else\n"))
+        self.assertIn("line 10", str(cm.exception))
+        with self.assertRaises(VhdlParseError):
+            fsm_table_from_vhdl("entity empty is\nend empty;\n")
+
+    def test_parse_directory(self):
+        good = vhdl_with_states("         when idle =>\n"
+                                "            state_next <= idle;\n")
+        bad = vhdl_with_states("         when idle =>\n"
+                               "            else\n")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            os.mkdir(os.path.join(tmp_dir, "sub"))
+            for relpath, vhdl in (("a.vhd", good), ("b.vhd", bad), (os.path.join("sub", "c.vhdl"), good)):
+                with open(os.path.join(tmp_dir, relpath), "w") as fout:
+                    fout.write(vhdl)
+
+            # the file that can't be parsed doesn't stop the others
+            for use_processes in (True, False):
+                programs, errors = parse_directory(tmp_dir, max_workers=2, use_processes=use_processes)
+                self.assertEqual(["a.vhd", os.path.join("sub", "c.vhdl")], sorted(programs))
+                self.assertEqual(["idle"], list(programs["a.vhd"].states))
+                self.assertEqual(["b.vhd"], list(errors))
+                self.assertIn("VhdlParseError", errors["b.vhd"])
@@ -0,0 +1,148 @@
+""" Headless batch generation of VHDL (and svg diagrams) from FSM table specs.
+
+Each spec is the same {'fsm_name': ..., 'table_vals': [[...], ...]} dict that the web UI posts. Specs are read from a
+directory of .json files, or from a JSON-lines file (one spec per line, "-" for stdin), and the outputs are generated
+in parallel across a process pool.
+
+Example:
+    python -m FSMs.batch specs/ -o build/fsms --jobs 8
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Iterator, TextIO
+
+from FSMs.lib.fsm import parse_table
+from FSMs.lib.graph import LAYOUT_ENGINES, render_graph
+from FSMs.lib.vhdl import write_vhdl
+
+def read_specs(source: str) -> Iterator[tuple[str, dict | None, str | None]]:
+    """ Yields (source name, spec, error) for every spec in the given directory or JSON-lines file. Specs that can't be
+    decoded are yielded with a None spec and the reason, so that the other specs are still generated. """
+    if os.path.isdir(source):
+        for filename in sorted(os.listdir(source)):
+            if not filename.endswith(".json"):
+                continue
+            with open(os.path.join(source, filename), "r") as fin:
+                yield (filename, *_decode_spec(fin.read()))
+    else:
+        fin = sys.stdin if source == "-" else open(source, "r")
+        try:
+            for lineno, line in enumerate(fin, start=1):
+                if line.strip() != "":
+                    yield (f"{source}:{lineno}", *_decode_spec(line))
+        finally:
+            if fin is not sys.stdin:
+                fin.close()
+
+def _decode_spec(sval: str) -> tuple[dict | None, str | None]:
+    try:
+        spec = json.loads(sval)
+    except ValueError as ex:
+        return None, f"{type(ex).__name__}: {ex}"
+    if not isinstance(spec, dict):
+        return None, f"expected a JSON object, not {type(spec).__name__}"
+    return spec, None
+
+def _write_file(path: str, write: Callable[[TextIO], Any]) -> Any:
+    """ Writes the file with write(fout) to a temporary file next to it, which only replaces path once write()
+    succeeds, so that a failed spec doesn't leave a truncated file behind. Returns write()'s return value. """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w") as fout:
+            ret = write(fout)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return ret
+
+def generate(spec: dict, out_dir: str, out_name: str, svg: bool = True, layout: str = None) -> tuple[int, int]:
+    """ Writes out_name.vhd (and out_name.svg) for the given spec. Returns the number of vhdl lines and svg bytes. """
+    fsm = parse_table(spec)
+    linecnt = _write_file(os.path.join(out_dir, out_name + ".vhd"), lambda fout: write_vhdl(fsm, fout))
+    svg_size = 0
+    if svg:
+        svg_str = render_graph(fsm, layout)
+        svg_size = _write_file(os.path.join(out_dir, out_name + ".svg"), lambda fout: fout.write(svg_str))
+    return linecnt, svg_size
+
+def _generate_job(job: tuple) -> tuple[str, int, int, str | None]:
+    source_name, spec, out_dir, out_name, svg, layout = job
+    try:
+        linecnt, svg_size = generate(spec, out_dir, out_name, svg, layout)
+        return source_name, linecnt, svg_size, None
+    except Exception as ex:
+        return source_name, 0, 0, f"{type(ex).__name__}: {ex}"
+
+class _OutNames():
+    """ Picks a unique output name for each spec, based on its fsm_name. """
+
+    def __init__(self):
+        self.used: set[str] = set()
+        self.counts: dict[str, int] = {}
+
+    def next(self, spec: dict) -> str:
+        name = re.sub(r'[^a-zA-Z0-9_]', '_', str(spec.get('fsm_name') or "fsm"))
+        count = self.counts.get(name, 0)
+        out_name = name if count == 0 else f"{name}_{count}"
+        while out_name in self.used: # eg a spec that is literally named "fsm_1"
+            count += 1
+            out_name = f"{name}_{count}"
+        self.counts[name] = count + 1
+        self.used.add(out_name)
+        return out_name
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Generate VHDL and svg diagrams for many FSM table specs.")
+    parser.add_argument("source", help="directory of .json specs, or a JSON-lines file of specs (\"-\" for stdin)")
+    parser.add_argument("-o", "--out-dir", default=".", help="directory to write the .vhd and .svg files to")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--no-svg", action="store_true", help="only generate the .vhd files")
+    parser.add_argument("--layout", default=None, choices=LAYOUT_ENGINES, help="diagram layout engine")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    out_names = _OutNames()
+    window = max(args.jobs or 1, 1) * 4 # jobs in flight, so that the specs are read as they're needed
+
+    start = time.perf_counter()
+    num_done, num_failed, total_lines, total_svg = 0, 0, 0, 0
+    def report(source_name: str, linecnt: int, svg_size: int, error: str | None):
+        nonlocal num_done, num_failed, total_lines, total_svg
+        if error is not None:
+            print(f"Error generating {source_name}: {error}", file=sys.stderr)
+            num_failed += 1
+            return
+        num_done += 1
+        total_lines += linecnt
+        total_svg += svg_size
+
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        pending: deque[Future] = deque()
+        for source_name, spec, error in read_specs(args.source):
+            if error is not None:
+                report(source_name, 0, 0, error)
+                continue
+            job = (source_name, spec, args.out_dir, out_names.next(spec), not args.no_svg, args.layout)
+            pending.append(executor.submit(_generate_job, job))
+            if len(pending) >= window:
+                report(*pending.popleft().result())
+        while len(pending) > 0:
+            report(*pending.popleft().result())
+    elapsed = time.perf_counter() - start
+
+    rate = num_done / elapsed if elapsed > 0 else 0
+    print(f"Generated {num_done} FSMs ({num_failed} failed) in {elapsed:.2f}s: {rate:.1f} FSMs/s, "
+          f"{total_lines} vhdl lines, {total_svg} svg bytes")
+    return 0 if num_failed == 0 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
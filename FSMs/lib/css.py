@@ -1,25 +1,80 @@
 from __future__ import annotations
 
+import os
 import tinycss
 import re
 
-def css_get_size(selector: str) -> tuple[float|None, float|None]:
-    parser = tinycss.make_parser()
-    ss = parser.parse_stylesheet_file("static/main.css")
-    table_css = list(filter(lambda r: r.selector.as_css() == selector, ss.rules))[0]
+from .metrics import stage_timer
+
+_css_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "static", "main.css")
 
+# parsed stylesheet sizes, keyed by the stylesheet path
+# each entry is (mtime, {selector: (width, height)})
+_stylesheet_cache: dict[str, tuple[float, dict[str, tuple[float|None, float|None]]]] = {}
+_css_cache_stats: dict[str, int] = {"hits": 0, "reloads": 0}
+
+def _declaration_size(declarations) -> tuple[float|None, float|None]:
     width, height = None, None
 
     for wstr in ["width", "min-width", "max-width"]:
-        width_decs = list(filter(lambda d: d.name == wstr, table_css.declarations))
+        width_decs = list(filter(lambda d: d.name == wstr, declarations))
         if len(width_decs) > 0:
             width = int(re.findall(r'\d+', width_decs[0].value.as_css())[0])
             break
 
     for hstr in ["height", "min-height", "max-height", "font-size"]:
-        height_decs = list(filter(lambda d: d.name == hstr, table_css.declarations))
+        height_decs = list(filter(lambda d: d.name == hstr, declarations))
         if len(height_decs) > 0:
             height = int(re.findall(r'\d+', height_decs[0].value.as_css())[0])
             break
 
     return width, height
+
+def _load_stylesheet_sizes(css_path: str) -> dict[str, tuple[float|None, float|None]]:
+    """ Parses the stylesheet and indexes the size of every rule by its selector. """
+    parser = tinycss.make_parser()
+    ss = parser.parse_stylesheet_file(css_path)
+
+    sizes = {}
+    for rule in ss.rules:
+        selector = rule.selector.as_css()
+        if selector not in sizes: # the first matching rule wins
+            sizes[selector] = _declaration_size(rule.declarations)
+    return sizes
+
+def _get_stylesheet_sizes(css_path: str) -> dict[str, tuple[float|None, float|None]]:
+    mtime = os.stat(css_path).st_mtime
+    cached = _stylesheet_cache.get(css_path)
+    if cached is not None and cached[0] == mtime:
+        _css_cache_stats["hits"] += 1
+        return cached[1]
+
+    sizes = _load_stylesheet_sizes(css_path)
+    _stylesheet_cache[css_path] = (mtime, sizes)
+    _css_cache_stats["reloads"] += 1
+    return sizes
+
+def css_get_size(selector: str, css_path: str = None) -> tuple[float|None, float|None]:
+    """ Get the (width, height) of the rule with the given selector.
+
+    The stylesheet is only re-parsed when its modification time changes.
+    """
+    if css_path is None:
+        css_path = _css_path
+    with stage_timer("css"):
+        return _get_stylesheet_sizes(css_path)[selector]
+
+def css_version(css_path: str = None) -> int:
+    """ Changes whenever the stylesheet does. Part of the cache key of renders that depend on css_get_size(). """
+    if css_path is None:
+        css_path = _css_path
+    return os.stat(css_path).st_mtime_ns
+
+def css_cache_stats() -> dict[str, int]:
+    """ Returns the number of stylesheet cache hits and reloads (file reads). """
+    return dict(_css_cache_stats)
+
+def css_cache_clear():
+    _stylesheet_cache.clear()
+    _css_cache_stats["hits"] = 0
+    _css_cache_stats["reloads"] = 0
@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import hashlib
+import re
+from array import array
+from typing import Iterator
+
+from .metrics import stage_timer
+
+NO_STATE = -1
+
+class FSM():
+    """ Compact representation of a finite state machine table.
+
+    States and transitions are interned as integers. State ids below num_states are the states that have a row in
+    the table (in order of their first row), ids at or above num_states are next states that don't have a row.
+    Transitions are stored in a dense num_states x num_transitions matrix of next state ids (NO_STATE for none).
+    """
+    __slots__ = ("name", "state_names", "state_index", "num_states",
+                 "transition_names", "transition_index", "rows", "columns", "next_state", "_fingerprint")
+
+    def __init__(self, name: str, table_vals: list[list[str]]):
+        self.name: str = name
+        self.state_names: list[str] = []
+        self.state_index: dict[str, int] = {}
+        self.transition_names: list[str] = []
+        self.transition_index: dict[str, int] = {}
+        self.rows: array = array('i')     # state id for each table row
+        self.columns: array = array('i')  # transition id for each table column
+        self._fingerprint: str | None = None
+
+        # intern the states and transitions
+        if len(table_vals) > 0:
+            for transition in table_vals[0][1:]:
+                self.columns.append(self._intern(transition, self.transition_names, self.transition_index))
+            for state_row in table_vals[1:]:
+                state = state_row[0] if (len(state_row) > 0) else ""
+                self.rows.append(self._intern(state, self.state_names, self.state_index))
+        self.num_states: int = len(self.state_names)
+
+        # build the next state matrix
+        num_transitions = len(self.transition_names)
+        self.next_state: array = array('i', [NO_STATE]) * (self.num_states * num_transitions)
+        for row_idx, state_row in enumerate(table_vals[1:]):
+            offset = self.rows[row_idx] * num_transitions
+            for col_idx, transition_id in enumerate(self.columns):
+                next_state = state_row[col_idx+1]
+                if next_state != "":
+                    next_state_id = self._intern(next_state, self.state_names, self.state_index)
+                    self.next_state[offset + transition_id] = next_state_id
+
+    @staticmethod
+    def _intern(name: str, names: list[str], index: dict[str, int]) -> int:
+        ret = index.get(name)
+        if ret is None:
+            ret = len(names)
+            index[name] = ret
+            names.append(name)
+        return ret
+
+    @property
+    def num_transitions(self) -> int:
+        return len(self.transition_names)
+
+    def row_states(self) -> list[str]:
+        """ The state name of every table row, in order. """
+        return [self.state_names[state_id] for state_id in self.rows]
+
+    def column_transitions(self) -> list[str]:
+        """ The transition name of every table column, in order. """
+        return [self.transition_names[transition_id] for transition_id in self.columns]
+
+    def table_vals(self) -> list[list[str]]:
+        """ The table rebuilt from the next state matrix, in the same [[...], ...] form that it was parsed from. """
+        num_transitions = len(self.transition_names)
+        ret = [[""] + self.column_transitions()]
+        for state_id in self.rows:
+            offset = state_id * num_transitions
+            next_states = (self.next_state[offset + transition_id] for transition_id in self.columns)
+            ret.append([self.state_names[state_id]] +
+                       ["" if (next_state_id == NO_STATE) else self.state_names[next_state_id]
+                        for next_state_id in next_states])
+        return ret
+
+    def get_next_state(self, state_id: int, transition_id: int) -> int:
+        if state_id >= self.num_states:
+            return NO_STATE
+        return self.next_state[state_id * len(self.transition_names) + transition_id]
+
+    def transitions_from(self, state_id: int) -> Iterator[tuple[int, int]]:
+        """ Yields (transition id, next state id) for every transition out of the given state. """
+        if state_id >= self.num_states:
+            return
+        num_transitions = len(self.transition_names)
+        offset = state_id * num_transitions
+        for transition_id in range(num_transitions):
+            next_state_id = self.next_state[offset + transition_id]
+            if next_state_id != NO_STATE:
+                yield transition_id, next_state_id
+
+    def to_json(self) -> dict:
+        """ A compact, JSON serializable form of the machine. States and transitions are referenced by their index in
+        "states" and "transitions", and "next_states" has one row per state with a row (-1 for no transition). """
+        num_transitions = len(self.transition_names)
+        return {
+            "fsm_name": self.name,
+            "fingerprint": self.fingerprint(),
+            "states": self.state_names,
+            "transitions": self.transition_names,
+            "rows": self.rows.tolist(),
+            "columns": self.columns.tolist(),
+            "next_states": [self.next_state[offset:offset+num_transitions].tolist()
+                            for offset in range(0, self.num_states*num_transitions, num_transitions)],
+        }
+
+    def fingerprint(self) -> str:
+        """ Canonical hash of the machine. The model is fully determined by its name, interned names, and the rows,
+        columns and next state matrix. """
+        if self._fingerprint is None:
+            sha1 = hashlib.sha1(repr((self.name, self.state_names, self.transition_names)).encode())
+            for ids in (self.rows, self.columns, self.next_state):
+                sha1.update(len(ids).to_bytes(8, "little"))
+                sha1.update(ids.tobytes())
+            self._fingerprint = sha1.hexdigest()
+        return self._fingerprint
+
+def parse_table(table_vals_in:dict[str,list[list[str]]] = None, clear_empty:bool = False) -> FSM:
+    with stage_timer("parse"):
+        return _parse_table(table_vals_in, clear_empty)
+
+def _parse_table(table_vals_in:dict[str,list[list[str]]], clear_empty:bool) -> FSM:
+    if table_vals_in is None:
+        table_vals = [["",     "reset", "start", "is_done"],
+                      ["IDLE", "IDLE",  "WORK",  ""],
+                      ["WORK", "IDLE",  "",      "IDLE"]]
+        fsm_name = "fsm"
+    else:
+        fsm_name = table_vals_in['fsm_name']
+        table_vals = table_vals_in['table_vals']
+
+    # filter the input to only valid characters
+    def filter_varname(sval):
+        sval = list(re.findall(r'[a-zA-Z_][a-zA-Z0-9_]+', sval))
+        if len(sval) == 0:
+            return ""
+        return sval[0]
+
+    # rebuild the table values with filtered strings
+    new_table_vals = []
+    for row in table_vals:
+        new_table_vals.append(list(map(filter_varname, row)))
+    table_vals = new_table_vals
+
+    # filter out empty rows and columns
+    if clear_empty:
+        new_table_vals = []
+
+        # clear empty rows
+        for row in table_vals:
+            if any(filter(lambda s: s != "", row)):
+                new_table_vals.append(row)
+        if len(new_table_vals) == 0:
+            return FSM(fsm_name, [])
+
+        # clear empty columns
+        for col_idx in range(len(new_table_vals[0])-1, -1, -1):
+            col_vals = [row[col_idx] for row in new_table_vals]
+            if not any(filter(lambda s: s != "", col_vals)):
+                for row in new_table_vals:
+                    del row[col_idx]
+
+        table_vals = new_table_vals
+
+    return FSM(fsm_name, table_vals)
@@ -4,17 +4,33 @@ import math
 import typing
 from typing import Any
 
+import numpy as np
+
 circle_t = typing.NewType("xyr", tuple[float, float, float])
 
 class Pxy():
+    """ Cartesian point. Compares and hashes by value, so don't change a point after it's been created.
+
+    Immutability isn't enforced (with a __setattr__ guard), because that makes creating points twice as slow.
+    """
+    __slots__ = ("x", "y")
+
     def __init__(self, x : float | Any, y : float | None = None):
-        if isinstance(x, Pxy):
-            other = x
-            self.x = other.x
-            self.y = other.y
-        else:
-            self.x = x
-            self.y = y
+        if (y is None) and isinstance(x, Pxy):
+            x, y = x.x, x.y
+        self.x = x
+        self.y = y
+
+    def __eq__(self, other):
+        if not isinstance(other, Pxy):
+            return NotImplemented
+        return self.x == other.x and self.y == other.y
+
+    def __hash__(self):
+        return hash((self.x, self.y))
+
+    def __reduce__(self):
+        return Pxy, (self.x, self.y)
 
     def xdist(self, other):
         return other.x - self.x
@@ -23,7 +39,7 @@ class Pxy():
         return other.y - self.y
 
     def dist(self, other):
-        return math.sqrt( (self.x-other.x)**2 + (self.y-other.y)**2 )
+        return math.hypot(self.x-other.x, self.y-other.y)
 
     def to_rad(self) -> Rad:
         return cart_to_rad(Pxy(0,0), self)
@@ -31,26 +47,42 @@ class Pxy():
     def __str__(self):
         return f"[{self.x}, {self.y}]"
 
+    def __repr__(self):
+        return f"Pxy({self.x!r}, {self.y!r})"
+
 class Rad():
+    """ Radial vector. Compares and hashes by value, so don't change a vector after it's been created, see Pxy. """
+    __slots__ = ("radians", "dist")
+
     def __init__(self, radians : float | Any, dist : float | None = None):
-        if isinstance(radians, Rad):
-            other = radians
-            self.radians = other.radians
-            self.dist = other.dist
-        else:
-            self.radians = radians
-            self.dist = dist
+        if (dist is None) and isinstance(radians, Rad):
+            radians, dist = radians.radians, radians.dist
+        self.radians = radians
+        self.dist = dist
+
+    def __eq__(self, other):
+        if not isinstance(other, Rad):
+            return NotImplemented
+        return self.radians == other.radians and self.dist == other.dist
+
+    def __hash__(self):
+        return hash((self.radians, self.dist))
+
+    def __reduce__(self):
+        return Rad, (self.radians, self.dist)
 
     def to_cart(self) -> Pxy:
         return rad_to_cart(self.radians, self.dist)
 
+    def __repr__(self):
+        return f"Rad({self.radians!r}, {self.dist!r})"
+
 def rad_to_cart(radians: Rad | float, dist: float | None=None, centerx: float | None=None, centery: float | None=None) -> Pxy:
     """ Radial vector (from center to North) to cartesian converter. """
-    rad = radians
-    if dist is not None:
-        rad = Rad(radians, dist)
-    x = rad.dist * math.sin(rad.radians)
-    y = -rad.dist * math.cos(rad.radians)
+    if dist is None:
+        radians, dist = radians.radians, radians.dist
+    x = dist * math.sin(radians)
+    y = -dist * math.cos(radians)
 
     if centerx is not None:
         x += centerx
@@ -67,35 +99,10 @@ def cart_to_rad(p1: Pxy, p2: Pxy) -> Rad:
     Radians increase clockwise
     X increases right, Y increases down
     """
-    p1 = Pxy(p1)
-    p2 = Pxy(p2)
-    xdist = p1.xdist(p2)
-    ydist = p1.ydist(p2)
-    dist = p1.dist(p2)
-
-    if (ydist == 0):
-        if xdist > 0:
-            radians = math.pi/2
-        else:
-            radians = math.pi*3/2
-    elif (xdist == 0):
-        if ydist > 0:
-            radians = math.pi
-        else:
-            radians = 0
-    else:
-        radians = math.asin(ydist / dist) # -pi/2 to pi/2
-
-        if xdist > 0:
-            if ydist <= 0: # quadrant 1
-                radians += math.pi/2
-            else: # quadrant 2
-                radians += math.pi/2
-        else:
-            if ydist > 0: # quadrant 3
-                radians = math.pi*3/2 - radians
-            else: # quadrant 4
-                radians = math.pi*3/2 + abs(radians)
+    xdist = p2.x - p1.x
+    ydist = p2.y - p1.y
+    radians = math.atan2(xdist, -ydist) % (2*math.pi)
+    dist = math.hypot(xdist, ydist)
 
     return Rad(radians, dist)
 
@@ -122,3 +129,57 @@ def circle_intersections(big_circle: circle_t, small_circle: circle_t) -> tuple[
     i2 = rad_to_cart(i2_rad, centerx=Bx, centery=By)
 
     return i1, i2
+
+# -----------------------------------------------------------------------------
+# Batch versions of the above, operating on numpy arrays of points.
+# Points are (n, 2) arrays of [x, y] and angles are (n,) arrays of radians.
+# -----------------------------------------------------------------------------
+
+def rad_to_cart_batch(radians: np.ndarray, dist: np.ndarray | float, centerx: np.ndarray | float = 0, centery: np.ndarray | float | None = None) -> np.ndarray:
+    """ Radial vectors (from center to North) to cartesian points. Returns an (n, 2) array. """
+    if centery is None:
+        centery = centerx
+    radians = np.asarray(radians, dtype=float)
+    ret = np.empty(radians.shape + (2,))
+    ret[..., 0] = dist * np.sin(radians) + centerx
+    ret[..., 1] = -dist * np.cos(radians) + centery
+    return ret
+
+def cart_to_rad_batch(p1: np.ndarray, p2: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """ Cartesian points to radial vectors from p1 to p2. Returns (radians, dist) arrays.
+
+    Radians increase clockwise from North, in the range [0, 2*pi)
+    X increases right, Y increases down
+    """
+    delta = np.asarray(p2, dtype=float) - np.asarray(p1, dtype=float)
+    xdist, ydist = delta[..., 0], delta[..., 1]
+    radians = np.mod(np.arctan2(xdist, -ydist), 2*math.pi)
+    return radians, np.hypot(xdist, ydist)
+
+def circle_vector_intersections_batch(circle: circle_t, vector_radians: np.ndarray, *distances) -> list[np.ndarray]:
+    return [rad_to_cart_batch(vector_radians, d, circle[0], circle[1]) for d in distances]
+
+def circle_intersections_batch(big_circle: circle_t, small_centers: np.ndarray, small_radius: float) -> tuple[np.ndarray, np.ndarray]:
+    """ Calculates the intersecting points for small circles whose centers lie on the perimeter of the big circle. """
+    Bx, By, Br = big_circle
+    xi_radians = abs( math.asin((small_radius / 2) / Br) * 2 )
+    s_radians, _ = cart_to_rad_batch([Bx, By], small_centers)
+    i1 = rad_to_cart_batch(s_radians - xi_radians, Br, Bx, By)
+    i2 = rad_to_cart_batch(s_radians + xi_radians, Br, Bx, By)
+    return i1, i2
+
+def arrowheads_batch(tips: np.ndarray, radians: np.ndarray, width: float, length: float) -> tuple[np.ndarray, np.ndarray]:
+    """ Calculates the two barb end points for arrows pointing into the given tips.
+
+    Parameters
+    ----------
+        tips: (n, 2) array of arrow tips
+        radians: (n,) array of the direction from the tip to the arrow's tail
+        width: angle between the barbs, in radians
+        length: length of the barbs
+    """
+    tips = np.asarray(tips, dtype=float)
+    radians = np.asarray(radians, dtype=float)
+    starts = rad_to_cart_batch(radians + width/2, length, tips[..., 0], tips[..., 1])
+    stops = rad_to_cart_batch(radians - width/2, length, tips[..., 0], tips[..., 1])
+    return starts, stops
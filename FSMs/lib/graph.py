@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import numpy as np
+
+from . import geometry as geo
+from .css import css_get_size
+from .fsm import FSM
+from .metrics import stage_timer
+from .layout import RingLayout, ring_layout, layered_layout, force_directed_layout, svg_arrow
+from .spatial import SpatialGrid
+
+# machines with more states than this are drawn with the layered layout by default
+RING_LAYOUT_MAX_STATES = 16
+LAYOUT_ENGINES = ("ring", "layered", "force")
+
+class UnknownLayout(ValueError):
+    """ The layout engine isn't one of LAYOUT_ENGINES. """
+
+def check_layout(engine: str | None):
+    """ Raises an UnknownLayout if the engine isn't None or one of LAYOUT_ENGINES. """
+    if (engine is not None) and (engine not in LAYOUT_ENGINES):
+        raise UnknownLayout(f"Unknown layout engine \"{engine}\", expected one of {', '.join(LAYOUT_ENGINES)}")
+
+class _TransitionTexts():
+    """ Collects the transition labels, merging labels that are within 10px of each other. """
+
+    def __init__(self):
+        self.grid = SpatialGrid(cell_size=10)
+
+    def add(self, p1: geo.Pxy, sval: str):
+        nearby = self.grid.first_within(p1, 10)
+        if nearby is not None:
+            nearby[1].append(sval)
+            return
+        self.grid.insert(p1, [sval])
+
+    def draw(self, svg: list[str], text_height: float):
+        for p1, svals in self.grid.items():
+            svals = list(filter(lambda s: s.replace("_","") != "", svals))
+            y_start = text_height * (len(svals)-1) / 2
+            for idx, sval in enumerate(svals):
+                p2 = geo.Pxy(p1.x, p1.y - y_start + text_height*idx)
+                svg.append(f"<text x='{p2.x}' y='{p2.y+5}'>{sval}</text>")
+
+def _draw_arrowheads(svg: list[str], arrows: list[tuple[int, geo.Pxy, geo.Pxy]], width: float, length: float):
+    """ Fills in the placeholder svg[idx] for every (idx, tail, tip) line with that line's arrowhead. """
+    if len(arrows) == 0:
+        return
+    tails = np.array([[xy1.x, xy1.y] for _, xy1, _ in arrows])
+    tips = np.array([[xy2.x, xy2.y] for _, _, xy2 in arrows])
+    arr_radians, _ = geo.cart_to_rad_batch(tips, tails)
+    arr_starts, arr_stops = geo.arrowheads_batch(tips, arr_radians, width, length)
+    for (svg_idx, _, tip), start, stop in zip(arrows, arr_starts.tolist(), arr_stops.tolist()):
+        svg[svg_idx] = svg_arrow(tip, geo.Pxy(*start), geo.Pxy(*stop))
+
+def render_graph(fsm: FSM, engine: str | None = None) -> str:
+    """ Renders the state diagram of the given FSM as an svg.
+
+    The svg is built up in an append-only list of fragments that is joined once at the end, so that the render time
+    and output size grow linearly with the number of states and transitions.
+
+    Parameters
+    ----------
+        engine: one of LAYOUT_ENGINES, or None to use the ring layout for machines with up to RING_LAYOUT_MAX_STATES
+                states and the layered layout for larger machines
+    """
+    states = list(filter(lambda s: s != "", fsm.row_states()))
+
+    # index of each state id in the graph
+    state_graph_idx: dict[int,int] = {}
+    for state_idx, state in enumerate(states):
+        state_graph_idx.setdefault(fsm.state_index[state], state_idx)
+
+    # find the transitions between drawn states
+    edges: list[tuple[int, int, str]] = []
+    for state1_id, state1_idx in state_graph_idx.items():
+        for transition_id, state2_id in fsm.transitions_from(state1_id):
+            state2_idx = state_graph_idx.get(state2_id)
+            if state2_idx is not None:
+                edges.append((state1_idx, state2_idx, fsm.transition_names[transition_id]))
+
+    check_layout(engine)
+    if engine is None:
+        engine = "ring" if len(states) <= RING_LAYOUT_MAX_STATES else "layered"
+
+    if len(states) == 0:
+        return "<svg width='0' height='0'></svg>"
+
+    _, text_height = css_get_size("div.diagram text")
+    if engine == "ring":
+        with stage_timer("layout"):
+            layout = ring_layout(len(states))
+        with stage_timer("emit"):
+            return _render_ring(states, edges, layout, text_height)
+
+    with stage_timer("layout"):
+        edge_idxs = np.array([[state1_idx, state2_idx] for state1_idx, state2_idx, _ in edges], dtype=int)
+        edge_idxs = edge_idxs.reshape(-1, 2)
+        if engine == "layered":
+            positions = layered_layout(len(states), edge_idxs)
+        else:
+            positions = force_directed_layout(len(states), edge_idxs)
+    with stage_timer("emit"):
+        return _render_positions(states, edges, positions, text_height)
+
+def _render_ring(states: list[str], edges: list[tuple[int, int, str]], layout: RingLayout,
+                 text_height: float) -> str:
+    """ Draws the states around a single ring. The ring geometry is shared between all machines with the same number
+    of states, see layout.ring_layout(). """
+    # prep
+    svg: list[str] = [f"<svg width='{layout.size}' height='{layout.size}'>"]
+    lines: list[tuple[int, geo.Pxy, geo.Pxy]] = [] # svg index, line start, line end
+    transition_texts = _TransitionTexts()
+
+    # draw some circles!
+    svg.extend(layout.state_circles)
+
+    # draw some transitions!
+    for state1_idx, state2_idx, transition in edges:
+        if (state1_idx == state2_idx):
+            # self-transition
+            svg.append(layout.self_arcs[state1_idx])
+            transition_texts.add(layout.self_labels[state1_idx], transition)
+            svg.append(layout.self_arrows[state1_idx])
+        elif (transition != "reset") and ((state2_idx == state1_idx+1) or (state2_idx == 0 and state1_idx == len(states)-1)):
+            # draw a clockwise arc
+            svg.append(layout.cw_arcs[state1_idx])
+            transition_texts.add(layout.cw_labels[state1_idx], transition)
+            svg.append(layout.cw_arrows[state1_idx])
+        elif (transition != "reset") and ((state1_idx == state2_idx+1) or (state1_idx == 0 and state2_idx == len(states)-1)):
+            # draw a counter-clockwise arc
+            svg.append(layout.ccw_arcs[state1_idx])
+            transition_texts.add(layout.ccw_labels[state1_idx], transition)
+            svg.append(layout.ccw_arrows[state1_idx])
+        else:
+            # draw an inside arc
+            xy1 = layout.insides[state1_idx]
+            xy2 = layout.insides[state2_idx]
+            svg.append(f"<path d='M {xy1.x} {xy1.y} L {xy2.x} {xy2.y}' />")
+            mid = geo.Pxy(xy1.x + xy1.xdist(xy2)*3/4, xy1.y + xy1.ydist(xy2)*3/4)
+            transition_texts.add(mid, transition)
+            lines.append((len(svg), xy1, xy2))
+            svg.append("") # filled in once all the arrowheads have been calculated
+
+    # draw all the line arrowheads at once
+    _draw_arrowheads(svg, lines, layout.arrow_width, layout.arrow_length)
+
+    # add some text!
+    for state_idx, state in enumerate(states):
+        p = layout.positions[state_idx]
+        svg.append(f"<text x='{p.x}' y='{p.y+5}'>{state}</text>")
+    transition_texts.draw(svg, text_height)
+
+    svg.append("</svg>")
+    return "".join(svg)
+
+def _render_positions(states: list[str], edges: list[tuple[int, int, str]], positions: np.ndarray, text_height: float,
+                      r1: float = 40, rself: float = 25) -> str:
+    """ Draws the states at the given positions, with straight transitions between them. The canvas is sized to fit. """
+    # fit the canvas to the states
+    margin = r1 + rself*2 + 20
+    positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+    if len(positions) > 0:
+        positions = positions - positions.min(axis=0) + margin
+        width, height = (positions.max(axis=0) + margin).tolist()
+    else:
+        width, height = margin*2, margin*2
+    pxys = [geo.Pxy(x, y) for x, y in positions.tolist()]
+
+    # prep
+    svg: list[str] = [f"<svg width='{width}' height='{height}'>"]
+    lines: list[tuple[int, geo.Pxy, geo.Pxy]] = [] # svg index, line start, line end
+    transition_texts = _TransitionTexts()
+
+    # draw some circles!
+    svg.extend(f"<circle cx='{p.x}' cy='{p.y}' r='{r1}' />" for p in pxys)
+
+    # trim the transitions so that they start and stop at the edges of the state circles
+    edge_idxs = np.array([[state1_idx, state2_idx] for state1_idx, state2_idx, _ in edges], dtype=int).reshape(-1, 2)
+    delta = positions[edge_idxs[:, 1]] - positions[edge_idxs[:, 0]]
+    dist = np.maximum(np.hypot(delta[:, 0], delta[:, 1]), 1e-9)[:, None]
+    starts = (positions[edge_idxs[:, 0]] + delta / dist * r1).tolist()
+    stops = (positions[edge_idxs[:, 1]] - delta / dist * r1).tolist()
+
+    # draw some transitions!
+    for (state1_idx, state2_idx, transition), start, stop in zip(edges, starts, stops):
+        if state1_idx == state2_idx:
+            # self-transition, drawn as a circle above the state
+            p = pxys[state1_idx]
+            pself = geo.Pxy(p.x, p.y - r1 - rself)
+            svg.append(f"<circle class='arc' cx='{pself.x}' cy='{pself.y}' r='{rself}' />")
+            transition_texts.add(pself, transition)
+        else:
+            xy1, xy2 = geo.Pxy(*start), geo.Pxy(*stop)
+            svg.append(f"<path d='M {xy1.x} {xy1.y} L {xy2.x} {xy2.y}' />")
+            mid = geo.Pxy(xy1.x + xy1.xdist(xy2)*3/4, xy1.y + xy1.ydist(xy2)*3/4)
+            transition_texts.add(mid, transition)
+            lines.append((len(svg), xy1, xy2))
+            svg.append("") # filled in once all the arrowheads have been calculated
+
+    # draw all the line arrowheads at once
+    _draw_arrowheads(svg, lines, RingLayout.arrow_width, RingLayout.arrow_length)
+
+    # add some text!
+    for p, state in zip(pxys, states):
+        svg.append(f"<text x='{p.x}' y='{p.y+5}'>{state}</text>")
+    transition_texts.draw(svg, text_height)
+
+    svg.append("</svg>")
+    return "".join(svg)
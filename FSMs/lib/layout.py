@@ -0,0 +1,258 @@
+from __future__ import annotations
+
+import math
+
+import numpy as np
+
+from . import geometry as geo
+from .cache import LRUCache
+
+def svg_arrow(tip: geo.Pxy, start: geo.Pxy, stop: geo.Pxy) -> str:
+    return f"<path d='M {start.x} {start.y} L {tip.x} {tip.y} L {stop.x} {stop.y}' />"
+
+class RingLayout():
+    """ Precomputed geometry for drawing num_states states evenly spaced around a ring.
+
+    Everything here depends only on the number of states and the radii, so that it can be reused across renders of
+    different machines. Index i of each list is the value for the i'th state around the ring. Clockwise arcs go from
+    state i to state i+1, counter-clockwise arcs go from state i to state i-1.
+
+    Parameters
+    ----------
+        r1: radius of the state circles
+        r2: radius of the ring
+        rself: radius of the self-transition circles
+    """
+    __slots__ = ("num_states", "r1", "r2", "rself", "size", "center",
+                 "positions", "insides", "state_circles",
+                 "self_arcs", "self_labels", "self_arrows",
+                 "cw_arcs", "cw_labels", "cw_arrows",
+                 "ccw_arcs", "ccw_labels", "ccw_arrows")
+
+    arrow_width = math.pi / 4
+    arrow_length = 10
+
+    def __init__(self, num_states: int, r1: float = 40, r2: float = 200, rself: float = 25):
+        self.num_states = num_states
+        self.r1, self.r2, self.rself = r1, r2, rself
+        self.size = r2*2 + r1*2 + rself*4 + 20*2
+        self.center = center = self.size / 2
+        ring = [center, center, r2]
+        outer_ring = [center, center, r2+25]
+
+        # state circles and the points where they intersect the rings
+        idxs = np.arange(num_states)
+        state_angles = 2*math.pi / num_states * idxs
+        positions = geo.rad_to_cart_batch(state_angles, r2, center)
+        lefts, rights = geo.circle_intersections_batch(ring, positions, r1)
+        insides, outsides = geo.circle_vector_intersections_batch(ring, state_angles, r2-r1, r2+r1)
+        outer_lefts, outer_rights = geo.circle_intersections_batch(outer_ring, positions, r1)
+        self.positions = self._to_pxys(positions)
+        self.insides = self._to_pxys(insides)
+        self.state_circles = [f"<circle cx='{p.x}' cy='{p.y}' r='{r1}' />" for p in self.positions]
+
+        # self-transitions, drawn as a circle just outside of the state
+        self_radians, _ = geo.cart_to_rad_batch([center, center], outsides)
+        self_centers = geo.rad_to_cart_batch(self_radians, r2+r1+rself, center)
+        self_arr_radians, _ = geo.cart_to_rad_batch(positions, outsides)
+        self.self_labels = self._to_pxys(self_centers)
+        self.self_arcs = [f"<circle class='arc' cx='{p.x}' cy='{p.y}' r='{rself}' />" for p in self.self_labels]
+        self.self_arrows = self._arrows(outsides, self_arr_radians + math.pi*5/11)
+
+        # clockwise transitions, along the ring
+        nexts = (idxs + 1) % max(num_states, 1)
+        cw_starts, cw_stops = rights, lefts[nexts]
+        self.cw_arcs = self._arcs(cw_starts, cw_stops, r2)
+        self.cw_labels = self._labels(cw_starts, cw_stops, 3/4, r2-25)
+        cw_arr_radians, _ = geo.cart_to_rad_batch(positions[nexts], cw_stops)
+        self.cw_arrows = self._arrows(cw_stops, cw_arr_radians - math.pi/25) # who knows why this is needed
+
+        # counter-clockwise transitions, along the outer ring
+        prevs = (idxs - 1) % max(num_states, 1)
+        ccw_starts, ccw_stops = outer_rights[prevs], outer_lefts
+        self.ccw_arcs = self._arcs(ccw_starts, ccw_stops, r2+25)
+        self.ccw_labels = self._labels(ccw_starts, ccw_stops, 1/4, r2+50)
+        ccw_arr_radians, _ = geo.cart_to_rad_batch(positions, ccw_starts)
+        self.ccw_arrows = self._arrows(ccw_starts, ccw_arr_radians + math.pi*9/13) # who knows why this is needed
+
+    @staticmethod
+    def _to_pxys(points: np.ndarray) -> list[geo.Pxy]:
+        return [geo.Pxy(x, y) for x, y in points.tolist()]
+
+    def _arcs(self, starts: np.ndarray, stops: np.ndarray, radius: float) -> list[str]:
+        return [f"<path d='M {xy1.x} {xy1.y} A {radius} {radius} 0 0 1 {xy2.x} {xy2.y}' />"
+                for xy1, xy2 in zip(self._to_pxys(starts), self._to_pxys(stops))]
+
+    def _labels(self, starts: np.ndarray, stops: np.ndarray, fraction: float, dist: float) -> list[geo.Pxy]:
+        """ Label positions at the given fraction of the way from the start to the stop angles. """
+        rad1, _ = geo.cart_to_rad_batch([self.center, self.center], starts)
+        rad2, _ = geo.cart_to_rad_batch([self.center, self.center], stops)
+        return self._to_pxys(geo.rad_to_cart_batch(rad1 + (rad2 - rad1) * fraction, dist, self.center))
+
+    def _arrows(self, tips: np.ndarray, radians: np.ndarray) -> list[str]:
+        starts, stops = geo.arrowheads_batch(tips, radians, self.arrow_width, self.arrow_length)
+        return [svg_arrow(tip, start, stop) for tip, start, stop in
+                zip(self._to_pxys(tips), self._to_pxys(starts), self._to_pxys(stops))]
+
+_ring_layouts = LRUCache(maxsize=64)
+
+def ring_layout(num_states: int, r1: float = 40, r2: float = 200, rself: float = 25) -> RingLayout:
+    """ Get the ring layout for the given number of states and radii, computing it only on first use. """
+    key = (num_states, r1, r2, rself)
+    return _ring_layouts.get_or_compute(key, lambda: RingLayout(num_states, r1, r2, rself))
+
+def ring_layout_stats() -> dict[str, int]:
+    return _ring_layouts.stats()
+
+# -----------------------------------------------------------------------------
+# Layouts for large machines, where a single ring becomes unreadable.
+# These take the edges as an (m, 2) array of [from, to] state indexes and
+# return an (n, 2) array of state positions.
+# -----------------------------------------------------------------------------
+
+def _bfs_layers(num_states: int, edges: np.ndarray) -> np.ndarray:
+    """ Assigns each state to the layer of its breadth-first depth from state 0 (or the first unvisited state). """
+    order = np.argsort(edges[:, 0], kind="stable")
+    targets = edges[order, 1].tolist()
+    starts = np.searchsorted(edges[order, 0], np.arange(num_states + 1)).tolist()
+
+    layers = [-1] * num_states
+    depth_offset = 0
+    for root in range(num_states):
+        if layers[root] >= 0:
+            continue
+        layers[root] = depth_offset
+        frontier = [root]
+        max_depth = depth_offset
+        while len(frontier) > 0:
+            next_frontier = []
+            for state in frontier:
+                depth = layers[state] + 1
+                for target in targets[starts[state]:starts[state+1]]:
+                    if layers[target] < 0:
+                        layers[target] = depth
+                        max_depth = max(max_depth, depth)
+                        next_frontier.append(target)
+            frontier = next_frontier
+        depth_offset = max_depth + 1 # disconnected parts are stacked below each other
+    return np.array(layers, dtype=int)
+
+def _rank_in_layer(layers: np.ndarray, keys: np.ndarray) -> np.ndarray:
+    """ Position of each state within its layer when sorted by key, centered on 0. """
+    order = np.lexsort((keys, layers))
+    sorted_layers = layers[order]
+    layer_starts = np.searchsorted(sorted_layers, sorted_layers, side="left")
+    layer_sizes = np.bincount(layers)[sorted_layers]
+    ranks = np.empty(len(layers))
+    ranks[order] = np.arange(len(layers)) - layer_starts - (layer_sizes - 1) / 2
+    return ranks
+
+def layered_layout(num_states: int, edges: np.ndarray, xspacing: float = 120, yspacing: float = 150, sweeps: int = 4) -> np.ndarray:
+    """ Sugiyama-style layered layout.
+
+    States are assigned to layers by their breadth-first depth from the initial state, then each layer is reordered
+    with the barycenter heuristic (alternating downward and upward sweeps) to reduce edge crossings.
+    """
+    edges = np.asarray(edges, dtype=int).reshape(-1, 2)
+    if num_states == 0:
+        return np.zeros((0, 2))
+    layers = _bfs_layers(num_states, edges)
+
+    # treat the edges as undirected for the crossing reduction
+    edges = edges[edges[:, 0] != edges[:, 1]]
+    a = np.concatenate([edges[:, 0], edges[:, 1]])
+    b = np.concatenate([edges[:, 1], edges[:, 0]])
+
+    ranks = _rank_in_layer(layers, np.arange(num_states))
+    for sweep in range(sweeps):
+        # downward sweeps order by the neighbors in the layers above, upward sweeps by the neighbors below
+        mask = (layers[a] < layers[b]) if (sweep % 2 == 0) else (layers[a] > layers[b])
+        counts = np.bincount(b[mask], minlength=num_states)
+        sums = np.bincount(b[mask], weights=ranks[a[mask]], minlength=num_states)
+        barycenters = np.where(counts > 0, sums / np.maximum(counts, 1), ranks)
+        ranks = _rank_in_layer(layers, barycenters)
+
+    return np.stack([ranks * xspacing, layers * yspacing], axis=1)
+
+def _balanced_cells(pos: np.ndarray, grid_size: int) -> tuple[np.ndarray, np.ndarray]:
+    """ Splits the states into grid_size x grid_size cells that each hold the same number of states (+/- 1).
+
+    States are split into columns by x, then each column is split into rows by y, like a two level k-d tree.
+    Returns the cell of each state, and the states ordered by cell.
+    """
+    num_states = len(pos)
+    cols = np.empty(num_states, dtype=int)
+    cols[np.argsort(pos[:, 0], kind="stable")] = np.arange(num_states) * grid_size // num_states
+    order = np.lexsort((pos[:, 1], cols))
+    sorted_cols = cols[order]
+    col_starts = np.searchsorted(sorted_cols, sorted_cols, side="left")
+    col_sizes = np.bincount(cols, minlength=grid_size)[sorted_cols]
+    cells = np.empty(num_states, dtype=int)
+    cells[order] = sorted_cols * grid_size + (np.arange(num_states) - col_starts) * grid_size // col_sizes
+    return cells, order
+
+def force_directed_layout(num_states: int, edges: np.ndarray, ideal_length: float = 150, iterations: int | None = None) -> np.ndarray:
+    """ Fruchterman-Reingold force-directed layout, with the repulsion approximated on a grid.
+
+    Each iteration splits the states into about sqrt(n) balanced cells of about sqrt(n) states each. Repulsion
+    between states in the same cell is calculated exactly, and repulsion from the states in every other cell is
+    approximated by a single body at that cell's center of mass. This makes each iteration O(n^1.5) instead of O(n^2).
+    Unlike Barnes-Hut there is only one level of cells (no quadtree), so far away cells are as detailed as nearby
+    ones. 5000 states take about 0.7s (20 iterations), use the layered layout when that is too slow.
+    """
+    edges = np.asarray(edges, dtype=int).reshape(-1, 2)
+    edges = edges[edges[:, 0] != edges[:, 1]]
+    if num_states == 0:
+        return np.zeros((0, 2))
+    if iterations is None:
+        iterations = max(20, min(100, 20000 // num_states)) # smaller machines can afford to settle more
+    k = ideal_length
+    k2 = k * k
+
+    # start from a sunflower spiral, which is deterministic and evenly spread
+    idxs = np.arange(num_states)
+    pos = geo.rad_to_cart_batch(idxs * math.pi * (3 - math.sqrt(5)), k * np.sqrt(idxs + 0.5) / 2)
+
+    grid_size = max(1, round(num_states ** 0.25))
+    num_cells = grid_size * grid_size
+    temperature = k * math.sqrt(num_states) / 4
+    for iteration in range(iterations):
+        cells, order = _balanced_cells(pos, grid_size)
+        counts = np.bincount(cells, minlength=num_cells)
+        comx = np.bincount(cells, weights=pos[:, 0], minlength=num_cells) / np.maximum(counts, 1)
+        comy = np.bincount(cells, weights=pos[:, 1], minlength=num_cells) / np.maximum(counts, 1)
+
+        # far field repulsion, from the center of mass of every other cell
+        dx = pos[:, 0, None] - comx[None, :]
+        dy = pos[:, 1, None] - comy[None, :]
+        weights = k2 * counts[None, :] / np.maximum(dx*dx + dy*dy, 1e-2)
+        weights[idxs, cells] = 0
+        disp = np.stack([(weights * dx).sum(axis=1), (weights * dy).sum(axis=1)], axis=1)
+
+        # near field repulsion, between the states in the same cell
+        # cells are padded out to the same size so that they can all be calculated at once
+        cell_starts = np.searchsorted(cells[order], np.arange(num_cells))
+        slots = np.arange(num_states) - cell_starts[cells[order]]
+        padded = np.zeros((num_cells, counts.max(), 2))
+        padded[cells[order], slots] = pos[order]
+        valid = np.zeros((num_cells, counts.max()))
+        valid[cells[order], slots] = 1
+        delta = padded[:, :, None, :] - padded[:, None, :, :]
+        weights = k2 / np.maximum(delta[..., 0]**2 + delta[..., 1]**2, 1e-2) * valid[:, :, None] * valid[:, None, :]
+        near = np.einsum("cij,cijk->cik", weights, delta)
+        disp[order] += near[cells[order], slots]
+
+        # attraction along edges
+        delta = pos[edges[:, 1]] - pos[edges[:, 0]]
+        dist = np.maximum(np.hypot(delta[:, 0], delta[:, 1]), 1e-2)
+        force = delta * (dist / k)[:, None]
+        for axis in range(2):
+            disp[:, axis] += np.bincount(edges[:, 0], weights=force[:, axis], minlength=num_states)
+            disp[:, axis] -= np.bincount(edges[:, 1], weights=force[:, axis], minlength=num_states)
+
+        # move each state at most temperature, then cool down
+        length = np.maximum(np.hypot(disp[:, 0], disp[:, 1]), 1e-9)
+        pos += disp * (np.minimum(length, temperature) / length)[:, None]
+        temperature *= 0.9
+
+    return pos
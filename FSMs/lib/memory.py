@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import re
+import threading
+import tracemalloc
+
+_size_units = {"": 1, "k": 1024, "m": 1024**2, "g": 1024**3}
+
+# the PeakMemory measurements that are active in each thread, innermost last
+_active = threading.local()
+
+def parse_size(sval: str | None) -> int | None:
+    """ Parses a byte count such as "1048576", "512k", "64M" or "1G". Returns None for None or "". """
+    if sval is None or sval.strip() == "":
+        return None
+    m = re.fullmatch(r'\s*(\d+)\s*([kKmMgG]?)[bB]?\s*', sval)
+    if m is None:
+        raise ValueError(f"Invalid size \"{sval}\", expected a number of bytes with an optional k, M or G suffix")
+    return int(m.group(1)) * _size_units[m.group(2).lower()]
+
+class PeakMemory():
+    """ Context manager that measures the peak traced allocation while it is active, in bytes, relative to the traced
+    allocation when it was entered. Starts tracemalloc if it isn't already tracing.
+
+    tracemalloc has one peak for the whole process, which every measurement resets. Measurements can be nested in the
+    same thread, but a measurement started by another thread resets the peak too, and other threads' allocations
+    count towards it, so while other threads are busy the peak is only approximate. Work in a process of its own (see
+    render_pool) is measured exactly, and its peak is added to the measurements of this thread with
+    record_external_peak().
+    """
+    __slots__ = ("start", "peak", "external", "_max")
+
+    def __init__(self):
+        self.start = 0
+        self.peak = 0
+        self.external = 0
+        self._max = 0
+
+    def __enter__(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        stack = _active_stack()
+        _fold_peak(stack) # keep the enclosing measurements' peaks before resetting it
+        tracemalloc.reset_peak()
+        self.start, _ = tracemalloc.get_traced_memory()
+        self._max = self.start
+        stack.append(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        stack = _active_stack()
+        _fold_peak(stack)
+        stack.remove(self)
+        self.peak = max(self._max - self.start, 0) + self.external
+        if len(stack) > 0:
+            stack[-1].external += self.external
+        return False
+
+def _fold_peak(stack: list[PeakMemory]):
+    _, peak = tracemalloc.get_traced_memory()
+    for peak_memory in stack:
+        peak_memory._max = max(peak_memory._max, peak)
+
+def _active_stack() -> list[PeakMemory]:
+    stack = getattr(_active, "stack", None)
+    if stack is None:
+        stack = _active.stack = []
+    return stack
+
+def record_external_peak(peak: int):
+    """ Adds the peak allocation of work done in another process (eg a render worker) to the innermost PeakMemory that
+    is active in this thread, if any. """
+    stack = _active_stack()
+    if len(stack) > 0:
+        stack[-1].external += peak
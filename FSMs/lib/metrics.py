@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import bisect
+import math
+import os
+import threading
+import time
+from typing import Callable
+
+# request and stage latency buckets, in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# peak request memory buckets, in bytes
+MEMORY_BUCKETS = tuple(float(2**n) for n in range(16, 32, 2)) # 64KiB to 1GiB
+
+class Histogram():
+    """ Counts of observed values in fixed, upper-bound inclusive buckets, plus their sum (not thread-safe). """
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # the last count is the +Inf bucket
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class _NullTimer():
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+_null_timer = _NullTimer()
+
+class _StageTimer():
+    """ Times a stage, excluding the time spent in any stage timers that are nested inside of it. """
+    __slots__ = ("metrics", "stage", "start", "nested")
+
+    def __init__(self, metrics: Metrics, stage: str):
+        self.metrics = metrics
+        self.stage = stage
+        self.nested = 0.0
+
+    def __enter__(self):
+        stack = self.metrics._stage_stack()
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        stack = self.metrics._stage_stack()
+        stack.pop()
+        if len(stack) > 0:
+            stack[-1].nested += elapsed
+        self.metrics.observe("fsms_stage_duration_seconds", elapsed - self.nested, stage=self.stage)
+        return False
+
+class Metrics():
+    """ A thread-safe registry of labelled histograms, served in the Prometheus text format.
+
+    Recording is a dictionary lookup and a bisect under a lock, so it is cheap enough to leave on. When disabled,
+    observations are dropped and stage timers are no-ops.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._families: dict[str, tuple[str, tuple[float, ...], dict[tuple, Histogram]]] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._diverted: list[tuple[str, float, dict[str, str]]] | None = None
+        self._collectors: dict[str, tuple[str, str, Callable[[], float]]] = {}
+        self.register("fsms_request_duration_seconds", "Request latency, by endpoint and status code.")
+        self.register("fsms_stage_duration_seconds", "Time spent in each stage of a render, by stage. Nested stages "
+                                                     "are excluded from the time of the stages they are nested in.")
+        self.register("fsms_request_peak_bytes", "Peak traced allocation of each request, by endpoint. Only recorded "
+                                                 "when memory tracing is turned on.", MEMORY_BUCKETS)
+
+    def register(self, name: str, help_text: str, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        with self._lock:
+            if name not in self._families:
+                self._families[name] = (help_text, tuple(buckets), {})
+
+    def register_collector(self, name: str, help_text: str, metric_type: str, collect: Callable[[], float]):
+        """ Adds a single-valued metric (eg metric_type "counter" or "gauge") whose value is read with collect() every
+        time the metrics are rendered. Used for counts that are already kept elsewhere, such as cache stats. """
+        with self._lock:
+            self._collectors[name] = (help_text, metric_type, collect)
+
+    def observe(self, name: str, value: float, **labels: str):
+        if not self.enabled:
+            return
+        if self._diverted is not None:
+            self._diverted.append((name, value, labels))
+            return
+        label_key = tuple(sorted(labels.items()))
+        with self._lock:
+            _, buckets, histograms = self._families[name]
+            histogram = histograms.get(label_key)
+            if histogram is None:
+                histogram = histograms[label_key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def divert(self, observations: list[tuple[str, float, dict[str, str]]] | None):
+        """ Appends all observations to the given list instead of recording them, or records them again for None. Used
+        by worker processes, whose observations are sent back to be recorded with observe_all() by the app. """
+        self._diverted = observations
+
+    def observe_all(self, observations: list[tuple[str, float, dict[str, str]]]):
+        for name, value, labels in observations:
+            self.observe(name, value, **labels)
+
+    def stage_timer(self, stage: str) -> _StageTimer | _NullTimer:
+        """ Context manager that records the time spent in the given stage (eg "parse", "css", "layout", "emit"). """
+        if not self.enabled:
+            return _null_timer
+        return _StageTimer(self, stage)
+
+    def _stage_stack(self) -> list[_StageTimer]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def clear(self):
+        with self._lock:
+            for _, _, histograms in self._families.values():
+                histograms.clear()
+
+    def render(self) -> str:
+        """ All of the histograms and collected metrics in the Prometheus text exposition format. """
+        lines: list[str] = []
+        with self._lock:
+            for name, (help_text, buckets, histograms) in self._families.items():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} histogram")
+                for label_key, histogram in histograms.items():
+                    labels = ",".join(f'{k}="{_escape(v)}"' for k, v in label_key)
+                    sep = "," if labels != "" else ""
+                    cumulative = 0
+                    for le, count in zip(buckets + (math.inf,), histogram.counts):
+                        cumulative += count
+                        sle = "+Inf" if le == math.inf else repr(float(le))
+                        lines.append(f'{name}_bucket{{{labels}{sep}le="{sle}"}} {cumulative}')
+                    slabels = "{" + labels + "}" if labels != "" else ""
+                    lines.append(f"{name}_sum{slabels} {histogram.sum!r}")
+                    lines.append(f"{name}_count{slabels} {histogram.count}")
+            collectors = list(self._collectors.items())
+        for name, (help_text, metric_type, collect) in collectors:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            lines.append(f"{name} {collect()}")
+        return "\n".join(lines) + "\n"
+
+def _escape(label_value) -> str:
+    return str(label_value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+# the app's metrics, set FSMS_METRICS=0 to turn them off
+metrics = Metrics(enabled=os.environ.get("FSMS_METRICS", "1") != "0")
+
+def stage_timer(stage: str) -> _StageTimer | _NullTimer:
+    return metrics.stage_timer(stage)
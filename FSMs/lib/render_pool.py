@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import multiprocessing
+import threading
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable
+
+from .memory import PeakMemory, record_external_peak
+from .metrics import metrics
+
+class AdmissionError(ValueError):
+    """ The FSM is too large to render. """
+
+class MalformedTable(ValueError):
+    """ The inputs aren't a {'fsm_name': ..., 'table_vals': [[...], ...]} table. """
+
+class RenderUnavailable(RuntimeError):
+    """ The render couldn't be completed right now, but could be retried later. """
+
+class RenderPoolBusy(RenderUnavailable):
+    pass
+
+class RenderTimeout(RenderUnavailable):
+    pass
+
+class MemoryBudgetExceeded(AdmissionError):
+    """ The render needed more memory than it is allowed. """
+
+def check_memory_budget(peak: int, memory_budget: int | None):
+    """ Raises a MemoryBudgetExceeded if the peak memory (in bytes) is over the budget. """
+    if (memory_budget is not None) and (peak > memory_budget):
+        raise MemoryBudgetExceeded(f"Rendering this FSM needed {peak} bytes, which is over the budget of "
+                                   f"{memory_budget}")
+
+def check_admission(table_vals_in: dict[str, list[list[str]]] | None, max_states: int | None,
+                    max_transitions: int | None):
+    """ Raises an AdmissionError if the (unparsed) table has more state rows or transition columns than allowed, or a
+    MalformedTable if it isn't a table at all. """
+    if table_vals_in is None:
+        return
+    table_vals = table_vals_in.get('table_vals') if isinstance(table_vals_in, dict) else None
+    if (not isinstance(table_vals, list)) or (not all(isinstance(row, list) for row in table_vals)):
+        raise MalformedTable("Expected the inputs to be {'fsm_name': ..., 'table_vals': [[...], ...]}")
+    num_states = max(len(table_vals) - 1, 0)
+    num_transitions = max(len(table_vals[0]) - 1, 0) if len(table_vals) > 0 else 0
+    if (max_states is not None) and (num_states > max_states):
+        raise AdmissionError(f"The FSM has {num_states} states, the most that can be rendered is {max_states}")
+    if (max_transitions is not None) and (num_transitions > max_transitions):
+        raise AdmissionError(f"The FSM has {num_transitions} transitions, the most that can be rendered is "
+                             f"{max_transitions}")
+
+def _run_job(func: Callable, args: tuple, trace_memory: bool,
+             memory_budget: int | None = None) -> tuple[Any, int | None, list]:
+    """ Runs in the worker process. Returns func's return value, its peak memory, and the metrics it observed. Each
+    worker runs one job at a time, so the peak is exact. """
+    observations = []
+    metrics.divert(observations)
+    try:
+        if not trace_memory:
+            return func(*args), None, observations
+        try:
+            with PeakMemory() as peak_memory:
+                ret = func(*args)
+        finally:
+            tracemalloc.stop()
+        check_memory_budget(peak_memory.peak, memory_budget)
+        return ret, peak_memory.peak, observations
+    finally:
+        metrics.divert(None)
+
+class RenderPool():
+    """ Runs renders in a bounded pool of worker processes, so that one large render doesn't stall the other requests
+    served by the same web worker.
+
+    At most max_workers renders run at once, and at most max_pending renders are running or waiting to run. Any more
+    are turned away with a RenderPoolBusy instead of being queued. Renders that take longer than timeout seconds raise
+    a RenderTimeout. A timed out render keeps its worker until it finishes, and counts against max_pending until then.
+
+    With max_workers=0, renders run inline in the calling thread (without the timeout).
+
+    Renders that need more than memory_budget bytes raise a MemoryBudgetExceeded instead of returning. Each render is
+    measured in its worker, or in the calling thread when inline (which is approximate, see PeakMemory).
+
+    The workers are started with start_method, by default "forkserver" where it's available and "spawn" otherwise. They
+    aren't forked from the web server, which is threaded: a fork can copy a lock held by another thread, and deadlock.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int = None, timeout: float = 30, start_method: str = None,
+                 memory_budget: int = None):
+        if start_method is None:
+            start_method = "forkserver" if ("forkserver" in multiprocessing.get_all_start_methods()) else "spawn"
+        self.max_workers = max_workers
+        self.start_method = start_method
+        self.max_pending = max_pending if (max_pending is not None) else max_workers * 2
+        self.timeout = timeout
+        self.memory_budget = memory_budget
+        self._slots = threading.BoundedSemaphore(max(self.max_pending, 1))
+        self._executor: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # started on first use, so that importing the app doesn't spawn any processes
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                     mp_context=multiprocessing.get_context(self.start_method))
+            return self._executor
+
+    def _reset_executor(self, executor: ProcessPoolExecutor):
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def run(self, func: Callable, *args) -> Any:
+        """ Returns func(*args), as computed by one of the workers. func and args must be picklable. """
+        if self.max_workers <= 0:
+            if self.memory_budget is None:
+                return func(*args)
+            with PeakMemory() as peak_memory:
+                ret = func(*args)
+            check_memory_budget(peak_memory.peak, self.memory_budget)
+            return ret
+        if not self._slots.acquire(blocking=False):
+            raise RenderPoolBusy(f"All {self.max_pending} render slots are in use, try again shortly")
+
+        executor = self._get_executor()
+        try:
+            trace_memory = tracemalloc.is_tracing() or (self.memory_budget is not None)
+            future = executor.submit(_run_job, func, args, trace_memory, self.memory_budget)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+
+        try:
+            ret, peak, observations = future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            raise RenderTimeout(f"Rendering took longer than {self.timeout} seconds") from None
+        except BrokenProcessPool:
+            # a worker died (eg it ran out of memory), start over with a new pool for the next render
+            self._reset_executor(executor)
+            raise RenderUnavailable("The render worker stopped unexpectedly") from None
+        if peak is not None:
+            record_external_peak(peak)
+        metrics.observe_all(observations)
+        return ret
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import math
+from typing import Any, Iterator
+
+from .geometry import Pxy
+
+class SpatialGrid():
+    """ Uniform grid index over points, for finding nearby points without scanning every point.
+
+    Points are bucketed into square cells of cell_size. Queries only check the cells that overlap the query radius, so
+    lookups are O(1) on average when the cell size is close to the typical query radius.
+    """
+
+    def __init__(self, cell_size: float):
+        self.cell_size = cell_size
+        self._cells: dict[tuple[int, int], list[int]] = {}
+        self._points: list[Pxy] = []
+        self._items: list[Any] = []
+
+    def _cell(self, x: float, y: float) -> tuple[int, int]:
+        return math.floor(x / self.cell_size), math.floor(y / self.cell_size)
+
+    def insert(self, p: Pxy, item: Any = None):
+        idx = len(self._points)
+        self._points.append(p)
+        self._items.append(item)
+        self._cells.setdefault(self._cell(p.x, p.y), []).append(idx)
+
+    def _query_indices(self, p: Pxy, radius: float) -> list[int]:
+        cx1, cy1 = self._cell(p.x - radius, p.y - radius)
+        cx2, cy2 = self._cell(p.x + radius, p.y + radius)
+        ret = []
+        for cx in range(cx1, cx2+1):
+            for cy in range(cy1, cy2+1):
+                for idx in self._cells.get((cx, cy), ()):
+                    if p.dist(self._points[idx]) < radius:
+                        ret.append(idx)
+        ret.sort() # insertion order
+        return ret
+
+    def query(self, p: Pxy, radius: float) -> list[tuple[Pxy, Any]]:
+        """ All (point, item) pairs strictly closer than radius to p, in insertion order. """
+        return [(self._points[idx], self._items[idx]) for idx in self._query_indices(p, radius)]
+
+    def first_within(self, p: Pxy, radius: float) -> tuple[Pxy, Any] | None:
+        """ The earliest inserted (point, item) pair strictly closer than radius to p, or None. """
+        indices = self._query_indices(p, radius)
+        if len(indices) == 0:
+            return None
+        return self._points[indices[0]], self._items[indices[0]]
+
+    def collides(self, p: Pxy, radius: float) -> bool:
+        return self.first_within(p, radius) is not None
+
+    def items(self) -> Iterator[tuple[Pxy, Any]]:
+        """ All (point, item) pairs, in insertion order. """
+        return zip(self._points, self._items)
+
+    def __len__(self) -> int:
+        return len(self._points)
@@ -0,0 +1,71 @@
+import threading
+import time
+from unittest import TestCase
+
+from lib.cache import LRUCache
+
+
+class Test(TestCase):
+    def test_lru_eviction(self):
+        cache = LRUCache(maxsize=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        self.assertEqual(1, cache.get("a")) # "b" is now the least recently used
+        cache.put("c", 3)
+        self.assertNotIn("b", cache)
+        self.assertIn("a", cache)
+        self.assertIn("c", cache)
+        self.assertEqual(1, cache.stats()["evictions"])
+
+        cache.resize(1)
+        self.assertEqual(["c"], [k for k in ["a", "b", "c"] if k in cache])
+
+    def test_get_or_compute(self):
+        cache = LRUCache(maxsize=4)
+        calls = []
+        def compute():
+            calls.append(1)
+            return "value"
+
+        self.assertEqual("value", cache.get_or_compute("key", compute))
+        self.assertEqual("value", cache.get_or_compute("key", compute))
+        self.assertEqual(1, len(calls))
+        stats = cache.stats()
+        self.assertEqual(1, stats["hits"])
+        self.assertEqual(1, stats["misses"])
+
+    def test_coalesce_concurrent_computes(self):
+        cache = LRUCache(maxsize=4)
+        started, release = threading.Event(), threading.Event()
+        calls = []
+        def compute():
+            calls.append(1)
+            started.set()
+            release.wait()
+            return "value"
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(cache.get_or_compute("key", compute)))
+        leader.start()
+        started.wait()
+        followers = [threading.Thread(target=lambda: results.append(cache.get_or_compute("key", compute)))
+                     for _ in range(3)]
+        for follower in followers:
+            follower.start()
+        while cache.stats()["coalesced"] < 3:
+            time.sleep(0.001)
+        release.set()
+        for thread in [leader] + followers:
+            thread.join()
+
+        self.assertEqual(["value"] * 4, results)
+        self.assertEqual(1, len(calls))
+        self.assertEqual(3, cache.stats()["coalesced"])
+
+    def test_coalesced_exception(self):
+        cache = LRUCache(maxsize=4)
+        def compute():
+            raise KeyError("nope")
+        with self.assertRaises(KeyError):
+            cache.get_or_compute("key", compute)
+        self.assertEqual("value", cache.get_or_compute("key", lambda: "value"))
@@ -0,0 +1,36 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from lib.css import css_get_size, css_cache_stats, css_cache_clear
+
+
+class Test(TestCase):
+    def setUp(self):
+        css_cache_clear()
+
+    def test_css_get_size(self):
+        self.assertEqual((800, 650), css_get_size("div.table"))
+        self.assertEqual((20, 20),   css_get_size("div.table .sym"))
+        self.assertEqual((30, None), css_get_size("div.table .sym.plus"))
+        self.assertEqual((None, 18), css_get_size("div.diagram text"))
+
+    def test_css_cache(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            css_path = os.path.join(tmpdir, "test.css")
+            with open(css_path, "w") as fout:
+                fout.write("div.a { width: 10px; height: 20px; }")
+            os.utime(css_path, (1, 1))
+
+            # first lookup loads the file, the rest are served from memory
+            self.assertEqual((10, 20), css_get_size("div.a", css_path))
+            self.assertEqual((10, 20), css_get_size("div.a", css_path))
+            self.assertEqual((10, 20), css_get_size("div.a", css_path))
+            self.assertEqual({"hits": 2, "reloads": 1}, css_cache_stats())
+
+            # changing the file invalidates the cache
+            with open(css_path, "w") as fout:
+                fout.write("div.a { width: 30px; height: 40px; }")
+            os.utime(css_path, (2, 2))
+            self.assertEqual((30, 40), css_get_size("div.a", css_path))
+            self.assertEqual({"hits": 2, "reloads": 2}, css_cache_stats())
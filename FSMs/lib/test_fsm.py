@@ -0,0 +1,64 @@
+from unittest import TestCase
+
+from lib.fsm import parse_table, NO_STATE
+
+
+class Test(TestCase):
+    def test_parse_table(self):
+        fsm = parse_table({"fsm_name": "fsm", "table_vals": [["",     "reset", "start", "is_done"],
+                                                             ["IDLE", "IDLE",  "WORK$", ""],
+                                                             ["WORK", "IDLE",  "",      "DONE"]]})
+        self.assertEqual("fsm", fsm.name)
+        self.assertEqual(["IDLE", "WORK"], fsm.row_states())
+        self.assertEqual(["reset", "start", "is_done"], fsm.column_transitions())
+        self.assertEqual(2, fsm.num_states)
+        self.assertEqual(["IDLE", "WORK", "DONE"], fsm.state_names) # DONE doesn't have a row
+
+        idle, work, done = fsm.state_index["IDLE"], fsm.state_index["WORK"], fsm.state_index["DONE"]
+        reset, start, is_done = fsm.transition_index["reset"], fsm.transition_index["start"], fsm.transition_index["is_done"]
+        self.assertEqual(work, fsm.get_next_state(idle, start))
+        self.assertEqual(NO_STATE, fsm.get_next_state(idle, is_done))
+        self.assertEqual(NO_STATE, fsm.get_next_state(done, reset))
+        self.assertEqual([(reset, idle), (is_done, done)], list(fsm.transitions_from(work)))
+
+    def test_parse_table_clear_empty(self):
+        table = {"fsm_name": "fsm", "table_vals": [["",     "reset", "", "go"],
+                                                   ["IDLE", "IDLE",  "", "WORK"],
+                                                   ["",     "",      "", ""],
+                                                   ["WORK", "IDLE",  "", ""]]}
+        self.assertEqual(["IDLE", "", "WORK"], parse_table(table).row_states())
+        fsm = parse_table(table, clear_empty=True)
+        self.assertEqual(["IDLE", "WORK"], fsm.row_states())
+        self.assertEqual(["reset", "go"], fsm.column_transitions())
+
+    def test_table_vals(self):
+        fsm = parse_table({"fsm_name": "fsm", "table_vals": [["",     "reset", "start$"],
+                                                             ["IDLE", "IDLE",  "WORK"],
+                                                             ["WORK", "IDLE",  ""]]})
+        self.assertEqual([["", "reset", "start"], ["IDLE", "IDLE", "WORK"], ["WORK", "IDLE", ""]], fsm.table_vals())
+        self.assertEqual([[""]], parse_table({"fsm_name": "fsm", "table_vals": [["", ""]]}, clear_empty=True).table_vals())
+
+    def test_fingerprint(self):
+        fsm1 = parse_table({"fsm_name": "fsm", "table_vals": [["", "go"], ["IDLE", "WORK"]]})
+        fsm2 = parse_table({"fsm_name": "fsm", "table_vals": [["", "go!"], ["IDLE", "WORK"]]})
+        fsm3 = parse_table({"fsm_name": "fsm", "table_vals": [["", "go"], ["IDLE", "IDLE"]]})
+        self.assertEqual(fsm1.fingerprint(), fsm2.fingerprint())
+        self.assertNotEqual(fsm1.fingerprint(), fsm3.fingerprint())
+        # the same names in a different arrangement
+        fsm4 = parse_table({"fsm_name": "fsm", "table_vals": [["", "go"], ["WORK", "IDLE"], ["IDLE", "WORK"]]})
+        fsm5 = parse_table({"fsm_name": "fsm", "table_vals": [["", "go"], ["WORK", "WORK"], ["IDLE", "IDLE"]]})
+        self.assertNotEqual(fsm4.fingerprint(), fsm5.fingerprint())
+
+    def test_to_json(self):
+        fsm = parse_table({"fsm_name": "fsm", "table_vals": [["",     "reset", "start"],
+                                                             ["IDLE", "IDLE",  "WORK"],
+                                                             ["WORK", "IDLE",  ""]]})
+        self.assertEqual({
+            "fsm_name": "fsm",
+            "fingerprint": fsm.fingerprint(),
+            "states": ["IDLE", "WORK"],
+            "transitions": ["reset", "start"],
+            "rows": [0, 1],
+            "columns": [0, 1],
+            "next_states": [[0, 1], [0, NO_STATE]],
+        }, fsm.to_json())
@@ -1,7 +1,10 @@
 import math
 from unittest import TestCase
 
-from lib.geometry import cart_to_rad, rad_to_cart, Pxy
+import numpy as np
+
+from lib.geometry import cart_to_rad, rad_to_cart, circle_intersections, circle_vector_intersections, Pxy, Rad
+from lib.geometry import cart_to_rad_batch, rad_to_cart_batch, circle_intersections_batch, circle_vector_intersections_batch, arrowheads_batch
 
 
 class Test(TestCase):
@@ -59,4 +62,59 @@ class Test(TestCase):
         self.assertAlmostEqual(-1,     rad_to_cart(math.pi*7/6, 2).x, delta=0.01)
         self.assertAlmostEqual(1.732,  rad_to_cart(math.pi*7/6, 2).y, delta=0.01)
         self.assertAlmostEqual(-1.732, rad_to_cart(math.pi*10/6, 2).x, delta=0.01)
-        self.assertAlmostEqual(-1,     rad_to_cart(math.pi*10/6, 2).y, delta=0.01)
\ No newline at end of file
+        self.assertAlmostEqual(-1,     rad_to_cart(math.pi*10/6, 2).y, delta=0.01)
+
+    def test_value_types(self):
+        self.assertEqual(Pxy(1, 2), Pxy(1, 2))
+        self.assertEqual(Pxy(1, 2), Pxy(Pxy(1, 2)))
+        self.assertNotEqual(Pxy(1, 2), Pxy(2, 1))
+        self.assertEqual(1, len({Pxy(1, 2), Pxy(1.0, 2.0)}))
+        self.assertEqual(Rad(math.pi, 2), Rad(Rad(math.pi, 2)))
+        self.assertEqual(1, len({Rad(math.pi, 2), Rad(math.pi, 2)}))
+        with self.assertRaises(AttributeError):
+            Pxy(1, 2).z = 3
+        with self.assertRaises(AttributeError):
+            Rad(1, 2).z = 3
+
+    def test_rad_to_cart_batch(self):
+        radians = np.linspace(0, 2*math.pi, 37)
+        dists = np.linspace(1, 10, 37)
+        batch = rad_to_cart_batch(radians, dists, 5, 7)
+        for i in range(len(radians)):
+            p = rad_to_cart(radians[i], dists[i], 5, 7)
+            self.assertAlmostEqual(p.x, batch[i][0], delta=1e-9)
+            self.assertAlmostEqual(p.y, batch[i][1], delta=1e-9)
+
+    def test_cart_to_rad_batch(self):
+        points = [[1, 0], [0, 1], [-1, 0], [0, -1], [1, -1], [1, 1], [-1, 1], [-1, -1],
+                  [1, -1.732], [1.732, 1], [-1, 1.732], [-1.732, -1], [3, -2], [-0.5, 4]]
+        center = [2, 3]
+        radians, dists = cart_to_rad_batch(center, np.array(points) + center)
+        for i, (x, y) in enumerate(points):
+            rad = cart_to_rad(Pxy(*center), Pxy(x + center[0], y + center[1]))
+            self.assertAlmostEqual(rad.radians, radians[i], delta=1e-9)
+            self.assertAlmostEqual(rad.dist, dists[i], delta=1e-9)
+
+    def test_circle_intersections_batch(self):
+        big_circle = [240, 240, 200]
+        centers = rad_to_cart_batch(np.linspace(0, 2*math.pi, 12, endpoint=False), 200, 240)
+        i1s, i2s = circle_intersections_batch(big_circle, centers, 40)
+        i3s, i4s = circle_vector_intersections_batch(big_circle, np.linspace(0, 2*math.pi, 12, endpoint=False), 160, 240)
+        for i, (x, y) in enumerate(centers):
+            i1, i2 = circle_intersections(big_circle, [x, y, 40])
+            i3, i4 = circle_vector_intersections(big_circle, 2*math.pi*i/12, 160, 240)
+            for p, batch in [(i1, i1s), (i2, i2s), (i3, i3s), (i4, i4s)]:
+                self.assertAlmostEqual(p.x, batch[i][0], delta=1e-9)
+                self.assertAlmostEqual(p.y, batch[i][1], delta=1e-9)
+
+    def test_arrowheads_batch(self):
+        tips = np.array([[0, 0], [10, 5], [-3, 8]])
+        radians = np.array([0, math.pi/3, 4])
+        starts, stops = arrowheads_batch(tips, radians, math.pi/4, 10)
+        for i, (x, y) in enumerate(tips):
+            start = rad_to_cart(Rad(radians[i] + math.pi/8, 10), centerx=x, centery=y)
+            stop = rad_to_cart(Rad(radians[i] - math.pi/8, 10), centerx=x, centery=y)
+            self.assertAlmostEqual(start.x, starts[i][0], delta=1e-9)
+            self.assertAlmostEqual(start.y, starts[i][1], delta=1e-9)
+            self.assertAlmostEqual(stop.x, stops[i][0], delta=1e-9)
+            self.assertAlmostEqual(stop.y, stops[i][1], delta=1e-9)
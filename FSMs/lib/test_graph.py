@@ -0,0 +1,49 @@
+from unittest import TestCase
+
+from lib.fsm import parse_table
+from lib.graph import render_graph
+
+
+def ring_table(num_states: int, num_transitions: int) -> dict:
+    """ Every state transitions to the next state and to itself on alternating transitions. """
+    transitions = [f"t{i}" for i in range(num_transitions)]
+    states = [f"S{i}" for i in range(num_states)]
+    table_vals = [[""] + transitions]
+    for state_idx, state in enumerate(states):
+        next_states = [states[(state_idx + (i % 2)) % num_states] for i in range(num_transitions)]
+        table_vals.append([state] + next_states)
+    return {"fsm_name": "ring", "table_vals": table_vals}
+
+
+class Test(TestCase):
+    def test_render_graph(self):
+        svg = render_graph(parse_table(None))
+        self.assertTrue(svg.startswith("<svg"))
+        self.assertTrue(svg.endswith("</svg>"))
+        self.assertEqual(2, svg.count("<circle cx"))
+        self.assertEqual(1, svg.count(">start</text>"))
+
+    def test_render_graph_without_states(self):
+        # one letter state names aren't valid states, so none of them are drawn
+        fsm = parse_table({"fsm_name": "f", "table_vals": [["", "go"], ["A", "B"], ["B", "A"]]})
+        for engine in (None, "ring", "layered", "force"):
+            self.assertEqual("<svg width='0' height='0'></svg>", render_graph(fsm, engine))
+
+    def test_render_graph_engines(self):
+        fsm = parse_table(ring_table(30, 2))
+        ring_svg = render_graph(fsm, "ring")
+        self.assertEqual(render_graph(fsm), render_graph(fsm, "layered")) # large machines default to the layered layout
+        for svg in [ring_svg, render_graph(fsm, "layered"), render_graph(fsm, "force")]:
+            self.assertEqual(30, svg.count("<circle cx"))
+            self.assertEqual(30, svg.count("<circle class='arc'"))
+        with self.assertRaises(ValueError):
+            render_graph(fsm, "spiral")
+
+    def test_render_graph_size_is_linear(self):
+        """ Regression benchmark: svg bytes per edge must not grow with the number of edges. """
+        bytes_per_edge = []
+        for num_transitions in [2, 4, 8, 16, 32]:
+            num_edges = 8 * num_transitions
+            svg = render_graph(parse_table(ring_table(8, num_transitions)))
+            bytes_per_edge.append(len(svg) / num_edges)
+        self.assertLess(bytes_per_edge[-1], bytes_per_edge[0] * 1.5, bytes_per_edge)
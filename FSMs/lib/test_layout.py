@@ -0,0 +1,47 @@
+import math
+from unittest import TestCase
+
+import numpy as np
+
+from lib.geometry import rad_to_cart
+from lib.layout import ring_layout, layered_layout, force_directed_layout
+
+
+class Test(TestCase):
+    def test_ring_layout(self):
+        layout = ring_layout(4)
+        self.assertEqual(4, len(layout.positions))
+        for state_idx, p in enumerate(layout.positions):
+            expected = rad_to_cart(math.pi/2 * state_idx, 200, layout.center)
+            self.assertAlmostEqual(expected.x, p.x, delta=1e-9)
+            self.assertAlmostEqual(expected.y, p.y, delta=1e-9)
+        for transitions in [layout.self_arcs, layout.self_arrows, layout.cw_arcs, layout.cw_arrows, layout.ccw_arcs, layout.ccw_arrows]:
+            self.assertEqual(4, len(transitions))
+
+    def test_ring_layout_is_cached(self):
+        self.assertIs(ring_layout(5), ring_layout(5))
+        self.assertIsNot(ring_layout(5), ring_layout(6))
+        self.assertIsNot(ring_layout(5), ring_layout(5, r2=300))
+
+    def test_layered_layout(self):
+        # 0 -> 1 -> 3, 0 -> 2 -> 3, 3 -> 0
+        edges = np.array([[0, 1], [0, 2], [1, 3], [2, 3], [3, 0]])
+        positions = layered_layout(4, edges, xspacing=100, yspacing=100)
+        self.assertEqual([0, 100, 100, 200], positions[:, 1].tolist())
+        self.assertEqual([0, -50, 50, 0], positions[:, 0].tolist())
+
+        # disconnected states are placed below the rest
+        positions = layered_layout(3, np.array([[0, 1]]), xspacing=100, yspacing=100)
+        self.assertEqual([0, 100, 200], positions[:, 1].tolist())
+
+    def test_force_directed_layout(self):
+        num_states = 200
+        edges = np.stack([np.arange(num_states), (np.arange(num_states) + 1) % num_states], axis=1)
+        positions = force_directed_layout(num_states, edges)
+        self.assertEqual((num_states, 2), positions.shape)
+        self.assertTrue(np.isfinite(positions).all())
+
+        # connected states should end up closer together than the average pair of states
+        edge_lengths = np.hypot(*(positions[edges[:, 0]] - positions[edges[:, 1]]).T)
+        all_lengths = np.hypot(*(positions[:, None, :] - positions[None, :, :]).transpose(2, 0, 1))
+        self.assertLess(edge_lengths.mean(), all_lengths.mean())
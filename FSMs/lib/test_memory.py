@@ -0,0 +1,38 @@
+import tracemalloc
+from unittest import TestCase
+
+from lib.memory import parse_size, PeakMemory
+
+
+class Test(TestCase):
+    def test_parse_size(self):
+        self.assertEqual(None, parse_size(None))
+        self.assertEqual(None, parse_size(""))
+        self.assertEqual(1000, parse_size("1000"))
+        self.assertEqual(512 * 1024, parse_size("512k"))
+        self.assertEqual(64 * 1024**2, parse_size("64MB"))
+        self.assertEqual(1024**3, parse_size("1G"))
+        with self.assertRaises(ValueError):
+            parse_size("lots")
+
+    def test_peak_memory(self):
+        if not tracemalloc.is_tracing():
+            self.addCleanup(tracemalloc.stop)
+        with PeakMemory() as small:
+            _ = bytearray(1024)
+        with PeakMemory() as large:
+            _ = bytearray(4 * 1024**2)
+        self.assertGreaterEqual(large.peak, 4 * 1024**2)
+        self.assertLess(small.peak, 1024**2)
+
+    def test_nested_peak_memory(self):
+        if not tracemalloc.is_tracing():
+            self.addCleanup(tracemalloc.stop)
+        with PeakMemory() as outer:
+            data = bytearray(4 * 1024**2)
+            del data
+            with PeakMemory() as inner:
+                _ = bytearray(1024)
+        # the inner measurement resets tracemalloc's peak, but the outer one still has its earlier peak
+        self.assertLess(inner.peak, 1024**2)
+        self.assertGreaterEqual(outer.peak, 4 * 1024**2)
@@ -0,0 +1,31 @@
+from unittest import TestCase
+
+from lib.metrics import Metrics
+
+
+class Test(TestCase):
+    def test_render_histogram(self):
+        metrics = Metrics()
+        metrics.observe("fsms_request_duration_seconds", 0.003, endpoint="update_graph", status="200")
+        metrics.observe("fsms_request_duration_seconds", 20, endpoint="update_graph", status="200")
+        text = metrics.render()
+        self.assertIn("# TYPE fsms_request_duration_seconds histogram", text)
+        self.assertIn('fsms_request_duration_seconds_bucket{endpoint="update_graph",status="200",le="0.0025"} 0', text)
+        self.assertIn('fsms_request_duration_seconds_bucket{endpoint="update_graph",status="200",le="0.005"} 1', text)
+        self.assertIn('fsms_request_duration_seconds_bucket{endpoint="update_graph",status="200",le="+Inf"} 2', text)
+        self.assertIn('fsms_request_duration_seconds_count{endpoint="update_graph",status="200"} 2', text)
+
+    def test_nested_stage_timers(self):
+        metrics = Metrics()
+        with metrics.stage_timer("emit"):
+            with metrics.stage_timer("css"):
+                pass
+        text = metrics.render()
+        self.assertIn('fsms_stage_duration_seconds_count{stage="emit"} 1', text)
+        self.assertIn('fsms_stage_duration_seconds_count{stage="css"} 1', text)
+
+    def test_disabled(self):
+        metrics = Metrics(enabled=False)
+        with metrics.stage_timer("parse"):
+            metrics.observe("fsms_request_duration_seconds", 1, endpoint="update_code", status="200")
+        self.assertNotIn("_count", metrics.render())
@@ -0,0 +1,53 @@
+import time
+import tracemalloc
+from unittest import TestCase
+
+from lib.render_pool import RenderPool, RenderPoolBusy, RenderTimeout, AdmissionError, MemoryBudgetExceeded, \
+    MalformedTable, check_admission
+
+
+def _slow_square(x: int, delay: float) -> int:
+    time.sleep(delay)
+    return x * x
+
+def _allocate(num_bytes: int) -> int:
+    return len(bytearray(num_bytes))
+
+
+class Test(TestCase):
+    def test_check_admission(self):
+        table = {'fsm_name': 'fsm', 'table_vals': [['', 'reset', 'go'], ['S0', 'S0', 'S1'], ['S1', 'S0', '']]}
+        check_admission(table, 2, 2)
+        check_admission(table, None, None)
+        check_admission(None, 1, 1)
+        with self.assertRaises(AdmissionError):
+            check_admission(table, 1, 2)
+        with self.assertRaises(AdmissionError):
+            check_admission(table, 2, 1)
+        for malformed in ({'fsm_name': 'fsm'}, {'table_vals': 'S0'}, {'table_vals': [['', 'go'], 'S0']}, [['', 'go']]):
+            with self.assertRaises(MalformedTable):
+                check_admission(malformed, 2, 2)
+
+    def test_inline(self):
+        self.assertEqual(9, RenderPool(max_workers=0).run(_slow_square, 3, 0))
+
+    def test_busy_and_timeout(self):
+        pool = RenderPool(max_workers=1, max_pending=1, timeout=0.2)
+        self.addCleanup(pool.shutdown)
+        self.assertEqual(4, pool.run(_slow_square, 2, 0))
+
+        with self.assertRaises(RenderTimeout):
+            pool.run(_slow_square, 2, 1)
+        # the timed out render is still using the only slot
+        with self.assertRaises(RenderPoolBusy):
+            pool.run(_slow_square, 2, 0)
+
+    def test_memory_budget(self):
+        if not tracemalloc.is_tracing():
+            self.addCleanup(tracemalloc.stop) # started by the inline measurement
+        for max_workers in (0, 1):
+            pool = RenderPool(max_workers=max_workers, memory_budget=1024**2)
+            self.addCleanup(pool.shutdown)
+            self.assertEqual(1024, pool.run(_allocate, 1024))
+            with self.assertRaises(MemoryBudgetExceeded):
+                pool.run(_allocate, 4 * 1024**2)
@@ -0,0 +1,31 @@
+import random
+from unittest import TestCase
+
+from lib.geometry import Pxy
+from lib.spatial import SpatialGrid
+
+
+class Test(TestCase):
+    def test_query_matches_linear_scan(self):
+        rand = random.Random(0)
+        points = [Pxy(rand.uniform(-100, 100), rand.uniform(-100, 100)) for i in range(500)]
+        grid = SpatialGrid(cell_size=10)
+        for idx, p in enumerate(points):
+            grid.insert(p, idx)
+
+        for i in range(200):
+            p = Pxy(rand.uniform(-110, 110), rand.uniform(-110, 110))
+            for radius in [5, 10, 25]:
+                expected = [idx for idx, p2 in enumerate(points) if p.dist(p2) < radius]
+                self.assertEqual(expected, [idx for p2, idx in grid.query(p, radius)])
+                first = grid.first_within(p, radius)
+                self.assertEqual(expected[0] if len(expected) > 0 else None, None if first is None else first[1])
+
+    def test_first_within(self):
+        grid = SpatialGrid(cell_size=10)
+        self.assertIsNone(grid.first_within(Pxy(0, 0), 10))
+        grid.insert(Pxy(9, 0), "a")
+        grid.insert(Pxy(1, 0), "b")
+        self.assertEqual("a", grid.first_within(Pxy(0, 0), 10)[1]) # earliest inserted wins, not the closest
+        self.assertFalse(grid.collides(Pxy(0, 10), 10))
+        self.assertEqual(["a", "b"], [item for p, item in grid.items()])
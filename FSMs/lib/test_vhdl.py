@@ -0,0 +1,29 @@
+import io
+from unittest import TestCase
+
+from lib.fsm import parse_table
+from lib.vhdl import vhdl_chunks, write_vhdl, render_vhdl_textarea
+
+
+class Test(TestCase):
+    def test_vhdl(self):
+        vhdl = "".join(vhdl_chunks(parse_table(None)))
+        self.assertIn("entity fsm is\n", vhdl)
+        self.assertIn("type state_type is (IDLE, WORK);\n", vhdl)
+        self.assertIn("         when IDLE =>\n"
+                      "            -- state logic\n"
+                      "            if (reset = '1') then\n"
+                      "               state_next <= IDLE;\n"
+                      "            elsif (start = '1') then\n"
+                      "               state_next <= WORK;\n"
+                      "            end if;\n", vhdl)
+        self.assertTrue(vhdl.endswith("end rtl;\n"))
+
+    def test_write_vhdl(self):
+        fsm = parse_table(None)
+        vhdl = "".join(vhdl_chunks(fsm))
+        fout = io.StringIO()
+        linecnt = write_vhdl(fsm, fout)
+        self.assertEqual(vhdl, fout.getvalue())
+        self.assertEqual(len(vhdl.split("\n")), linecnt)
+        self.assertEqual(f"<textarea rows='{linecnt}' cols='80'>{vhdl}</textarea>", render_vhdl_textarea(fsm))
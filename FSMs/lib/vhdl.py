@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import math
+from typing import Iterator, TextIO
+
+from .fsm import FSM
+from .metrics import stage_timer
+
+class NoStates(ValueError):
+    """ The FSM doesn't have any states, so there is no VHDL for it. """
+
+def check_states(fsm: FSM):
+    """ Raises a NoStates if the FSM doesn't have any state rows. """
+    if len(fsm.rows) == 0:
+        raise NoStates(f"The FSM \"{fsm.name}\" doesn't have any states")
+
+def vhdl_chunks(fsm: FSM) -> Iterator[str]:
+    """ Generates the VHDL for the given FSM, one chunk (a group of lines) at a time. The FSM is checked before the
+    first chunk is generated, so that an FSM without any states raises a NoStates here instead of part way through
+    a stream. """
+    check_states(fsm)
+    return _vhdl_chunks(fsm)
+
+def _vhdl_chunks(fsm: FSM) -> Iterator[str]:
+    fsm_name, states, transitions = fsm.name, fsm.row_states(), fsm.column_transitions()
+    table_vals_str = str({'fsm_name': fsm_name, 'table_vals': fsm.table_vals()})
+    transition_empty = lambda s: s.replace("_","") == ""
+    nonempty_transitions = list(filter(lambda s: not transition_empty(s), transitions))
+    s = "   "
+
+    yield f"-----------------------------------------------------------\n" \
+          f"-- FSM created with https://github.com/gladclef/FSMs\n" \
+          f"-- {table_vals_str}\n" \
+          f"-----------------------------------------------------------\n" \
+          f"\n" \
+          f"library IEEE;\n" \
+          f"use IEEE.STD_LOGIC_1164.ALL;\n" \
+          f"use IEEE.NUMERIC_STD.ALL;\n" \
+          f"\n" \
+          f"entity {fsm_name} is\n" \
+          f"{s*1}Port (\n" \
+          f"{s*2}reset : in std_logic;\n" \
+          f"{s*2}clk : in std_logic\n" \
+          f"{s*1});\n" \
+          f"end {fsm_name};\n" \
+          f"\n" \
+          f"architecture rtl of {fsm_name} is\n"
+    yield f"{s*1}type state_type is ({', '.join(states)});\n" \
+          f"{s*1}-- other type declarations\n" \
+          f"\n" \
+          f"{s*1}signal state_reg, state_next: state_type;\n"
+    for transition in nonempty_transitions:
+        if transition != "reset":
+            yield f"{s*1}signal {transition}: std_logic;\n"
+    yield f"{s*1}-- other signal declarations\n" \
+          f"begin\n" \
+          f"\n" \
+          f"{s*1}-- state and data register\n" \
+          f"{s*1}process(clk, reset)\n" \
+          f"{s*1}begin\n" \
+          f"{s*2}if (reset = '1') then\n" \
+          f"{s*3}state_reg <= {states[0]};\n" \
+          f"{s*2}elsif (rising_edge(clk)) then\n" \
+          f"{s*2}   state_reg <= state_next;\n" \
+          f"{s*2}end if;\n" \
+          f"{s*1}end process;\n" \
+          f"\n" \
+          f"{s*1}-- combinational circuit\n" \
+          f"{s*1}process(state_reg, {', '.join(nonempty_transitions)})\n" \
+          f"{s*1}begin\n" \
+          f"{s*2}state_next <= state_reg;\n" \
+          f"\n" \
+          f"{s*2}case state_reg is\n"
+
+    for state_id in fsm.rows:
+        state = fsm.state_names[state_id]
+        yield f"{s*3}when {state} =>\n" \
+              f"{s*4}-- state logic\n"
+        first_transition = True
+        for transition_id, state_next_id in fsm.transitions_from(state_id):
+            transition, state_next = fsm.transition_names[transition_id], fsm.state_names[state_next_id]
+            if not transition_empty(transition):
+                ifstr = "if" if first_transition else "elsif"
+                yield f"{s*4}{ifstr} ({transition} = '1') then\n" \
+                      f"{s*5}state_next <= {state_next};\n"
+                first_transition = False
+            elif first_transition:
+                yield f"{s*4}state_next <= {state_next};\n"
+            else:
+                yield f"{s*4}else\n" \
+                      f"{s*5}state_next <= {state_next};\n"
+        if not first_transition:
+            yield f"{s*4}end if;\n" \
+                  f"\n"
+        else:
+            yield f"\n"
+
+    yield f"{s*2}end case;\n" \
+          f"{s*1}end process;\n" \
+          f"\n"
+
+    i = 0
+    state_nb = math.ceil(math.log2(len(states)))
+    align_space = " "*7
+    for i, state in enumerate(states):
+        if i == 0:
+            yield f"{s*1}-- dbg <= \"{'0'*state_nb}\" when state_reg = {state} else\n"
+            continue
+        bits = ("{0:0"+str(state_nb)+"b}").format(i)
+        yield f"{s*1}-- {align_space}\"{bits}\" when state_reg = {state} else\n"
+    bits = ("{0:0"+str(state_nb)+"b}").format( 2**state_nb-1 )
+    yield f"{s*1}-- {align_space}\"{bits}\";\n" \
+          "\n"
+
+    yield f"end rtl;\n"
+
+def write_vhdl(fsm: FSM, fout: TextIO) -> int:
+    """ Streams the VHDL for the given FSM to fout. Returns the number of lines written. """
+    linecnt = 1
+    for chunk in vhdl_chunks(fsm):
+        fout.write(chunk)
+        linecnt += chunk.count("\n")
+    return linecnt
+
+def render_vhdl_textarea(fsm: FSM) -> str:
+    """ The VHDL for the given FSM, wrapped in a textarea that is tall enough to show all of it. """
+    with stage_timer("emit"):
+        chunks = [""] # the textarea's rows are filled in once all of the lines have been counted
+        linecnt = 1
+        for chunk in vhdl_chunks(fsm):
+            chunks.append(chunk)
+            linecnt += chunk.count("\n")
+        chunks[0] = f"<textarea rows='{linecnt}' cols='80'>"
+        chunks.append("</textarea>")
+        return "".join(chunks)
@@ -1,82 +1,103 @@
+import functools
+import hashlib
 import math
-from flask import Flask, redirect, url_for, request, render_template, jsonify
+import os
+import threading
+import time
+from flask import Flask, Response, redirect, url_for, request, render_template, jsonify, g
 
+from ASMD_generator.Program import VhdlParseError, fsm_table_from_vhdl
 from FSMs.lib.css import *
-import FSMs.lib.geometry as geo
+from FSMs.lib.cache import LRUCache
+from FSMs.lib.fsm import FSM, NO_STATE, parse_table
+from FSMs.lib.graph import LAYOUT_ENGINES, UnknownLayout, check_layout, render_graph
+from FSMs.lib.memory import PeakMemory, parse_size
+from FSMs.lib.metrics import metrics, stage_timer
+from FSMs.lib.render_pool import RenderPool, AdmissionError, MalformedTable, RenderUnavailable, check_admission, \
+    check_memory_budget
+from FSMs.lib.vhdl import NoStates, render_vhdl_textarea, vhdl_chunks
 
 app = Flask(__name__)
-
-def parse_table(table_vals_in:dict[str,list[list[str]]] = None, clear_empty:bool = False) -> tuple[str, list[list[str]], list[str], list[str], dict[str,dict[str,str]]]:
-    if table_vals_in is None:
-        table_vals = [["",     "reset", "start", "is_done"],
-                      ["IDLE", "IDLE",  "WORK",  ""],
-                      ["WORK", "IDLE",  "",      "IDLE"]]
-        fsm_name = "fsm"
-    else:
-        fsm_name = table_vals_in['fsm_name']
-        table_vals = table_vals_in['table_vals']
-
-    # filter the input to only valid characters
-    def filter_varname(sval):
-        sval = list(re.findall(r'[a-zA-Z_][a-zA-Z0-9_]+', sval))
-        if len(sval) == 0:
-            return ""
-        return sval[0]
-
-    # rebuild the table values with filtered strings
-    new_table_vals = []
-    for row in table_vals:
-        new_table_vals.append(list(map(filter_varname, row)))
-    table_vals = new_table_vals
-
-    # filter out empty rows and columns
-    if clear_empty:
-        new_table_vals = []
-
-        # clear empty rows
-        for row in table_vals:
-            if any(filter(lambda s: s != "", row)):
-                new_table_vals.append(row)
-        if len(new_table_vals) == 0:
-            return fsm_name, [], [], [], {}
-
-        # clear empty columns
-        for col_idx in range(len(new_table_vals[0])-1, -1, -1):
-            col_vals = [row[col_idx] for row in new_table_vals]
-            if not any(filter(lambda s: s != "", col_vals)):
-                for row in new_table_vals:
-                    del row[col_idx]
-
-        table_vals = new_table_vals
-
-    # extract the states and transitions
-    states, transitions = [], []
-    if len(table_vals) > 0:
-        states = [l[0] for l in table_vals[1:]]
-        if len(table_vals[0]) > 1:
-            transitions = table_vals[0][1:]
-    transition_map = {state:{} for state in states}
-
-    # extract the state transition mapping
-    if len(table_vals) > 0:
-        for state_row in table_vals[1:]:
-            state = state_row[0] if (len(state_row) > 0) else ""
-            for trans_idx in range(len(transitions)):
-                transition = transitions[trans_idx]
-                next_state = state_row[trans_idx+1]
-                if next_state != "":
-                    transition_map[state][transition] = next_state
-
-    return fsm_name, table_vals, states, transitions, transition_map
-
-def populate_fsm_name(table_vals:dict[str,list[list[str]]] = None) -> str:
-    fsm_name, table_vals, states, transitions, transition_map = parse_table(table_vals)
-    ret = f"<div class='fsm_name_container'>FSM Name: <input type='text' class='fsm_name' value='{fsm_name}' /></div>"
+render_cache = LRUCache(maxsize=int(os.environ.get("FSMS_RENDER_CACHE_SIZE", 128)))
+metrics.register_collector("fsms_render_cache_hits_total", "Renders served from the render cache.", "counter",
+                           lambda: render_cache.stats()["hits"])
+metrics.register_collector("fsms_render_cache_misses_total", "Renders that had to be computed.", "counter",
+                           lambda: render_cache.stats()["misses"])
+metrics.register_collector("fsms_render_cache_coalesced_total", "Renders that waited for an identical render that "
+                           "was already in flight, instead of computing it again.", "counter",
+                           lambda: render_cache.stats()["coalesced"])
+
+# peak memory allowed per render request (eg "256M"), None for no limit
+memory_budget = parse_size(os.environ.get("FSMS_MEMORY_BUDGET"))
+# measure the peak memory of render requests, always on when there is a memory budget
+trace_memory = (memory_budget is not None) or (os.environ.get("FSMS_TRACE_MEMORY", "0") != "0")
+
+# graph and code renders run in worker processes, 0 workers to render inline
+render_pool = RenderPool(max_workers=int(os.environ.get("FSMS_RENDER_WORKERS", min(4, os.cpu_count() or 1))),
+                         max_pending=int(os.environ.get("FSMS_RENDER_QUEUE", 0)) or None,
+                         timeout=float(os.environ.get("FSMS_RENDER_TIMEOUT", 30)),
+                         memory_budget=memory_budget)
+# largest tables that will be rendered, None for no limit
+max_states = int(os.environ.get("FSMS_MAX_STATES", 5000))
+max_transitions = int(os.environ.get("FSMS_MAX_TRANSITIONS", 256))
+
+# tables parsed from uploaded .vhd files, by the sha1 of the file, so that importing the same design again is instant
+import_cache = LRUCache(maxsize=int(os.environ.get("FSMS_IMPORT_CACHE_SIZE", 32)))
+# largest .vhd file that can be imported, None for no limit
+max_import_size = parse_size(os.environ.get("FSMS_MAX_IMPORT_SIZE", "16M"))
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def observe_request_time(response: Response) -> Response:
+    if "request_start" in g and request.endpoint != "get_metrics":
+        elapsed = time.perf_counter() - g.request_start
+        metrics.observe("fsms_request_duration_seconds", elapsed,
+                        endpoint=request.endpoint or "none", status=str(response.status_code))
+    return response
+
+@app.errorhandler(AdmissionError)
+def too_large(ex: AdmissionError):
+    return jsonify({"error": str(ex)}), 413
+
+@app.errorhandler(MalformedTable)
+def malformed_table(ex: MalformedTable):
+    return jsonify({"error": str(ex)}), 400
+
+@app.errorhandler(UnknownLayout)
+def unknown_layout(ex: UnknownLayout):
+    return jsonify({"error": str(ex)}), 400
+
+@app.errorhandler(VhdlParseError)
+def unparseable_vhdl(ex: VhdlParseError):
+    return jsonify({"error": str(ex)}), 400
+
+@app.errorhandler(NoStates)
+def no_states(ex: NoStates):
+    return jsonify({"error": str(ex)}), 400
+
+@app.errorhandler(RenderUnavailable)
+def render_unavailable(ex: RenderUnavailable):
+    return jsonify({"error": str(ex)}), 503, {"Retry-After": "1"}
+
+def populate_fsm_name(table_vals:dict[str,list[list[str]]] = None, parsed:FSM = None) -> str:
+    if parsed is None:
+        parsed = parse_table(table_vals)
+    ret = f"<div class='fsm_name_container'>FSM Name: <input type='text' class='fsm_name' value='{parsed.name}' /></div>"
     return ret
 
-def populate_table(table_vals:dict[str,list[list[str]]] = None, clear_empty:bool = False) -> str:
-    fsm_name, table_vals, states, transitions, transition_map = parse_table(table_vals, clear_empty)
-    ret = ""
+def populate_table(table_vals:dict[str,list[list[str]]] = None, clear_empty:bool = False, parsed:FSM = None) -> str:
+    if parsed is None:
+        parsed = parse_table(table_vals, clear_empty)
+    def render():
+        with stage_timer("emit"):
+            return _populate_table(parsed)
+    return render_cache.get_or_compute(("table", parsed.fingerprint(), css_version()), within_budget(render))
+
+def _populate_table(fsm:FSM) -> str:
+    states, transitions = fsm.row_states(), fsm.column_transitions()
 
     # get dimensions
     width, height = css_get_size("div.table")
@@ -84,14 +105,16 @@ def populate_table(table_vals:dict[str,list[list[str]]] = None, clear_empty:bool
     symplusw, symplush = css_get_size("div.table .sym.plus")
     cwidth = max(120, min(200, math.floor((width-2*symw-symplusw-20) / (len(transitions)+1) )))
     rheight = max(20, min(40, height / (len(states)+2) ))
-    column_style = f"style='width: {cwidth}px'"
-    cell_style   = f"style='width: {cwidth}px; height: {rheight}px'"
-    row_style    = f"style='width: {cwidth*(len(transitions)+1) + symw*2 + symplusw}px'"
+    rwidth = cwidth*(len(transitions)+1) + symw*2 + symplusw
+
+    # the cells are sized by one shared rule, instead of a style attribute on every cell
+    ret = [f"<style>div.table .tcell {{ width: {cwidth}px; height: {rheight}px; }} "
+           f"div.table .row, div.table .col_adjustments {{ width: {rwidth}px; }} "
+           f"div.table .col_adjustments > div {{ width: {cwidth}px; }}</style>"]
 
     # build the table
-    def cell(txt, row_idx, col_idx, *classes):
-        sclasses = " ".join(classes)
-        return f"<input type='text' class='tcell {sclasses}' {cell_style} name='{row_idx}_{col_idx}' value='{txt}' />"
+    def cell(txt, row_idx, col_idx, classes="tcell"):
+        return f"<input type='text' class='{classes}' name='{row_idx}_{col_idx}' value='{txt}' />"
     def row_syms(row_index):
         return f"<div class='sym up' onclick='row_up({row_index})'>▲</div>" + \
                f"<div class='sym down' onclick='row_down({row_index})'>▼</div>" + \
@@ -101,302 +124,230 @@ def populate_table(table_vals:dict[str,list[list[str]]] = None, clear_empty:bool
                f"<div class='sym plus' onclick='col_plus({col_index})'>➕</div>" + \
                f"<div class='sym right' onclick='col_right({col_index})'>▶</div>"
     # ... header
-    header_row = f"<div class='row' {row_style}><div class='tcell header' {cell_style}></div>"
-    for col_idx in range(len(transitions)):
-        transition = transitions[col_idx]
-        header_row += cell(transition, 0, col_idx+1, 'header')
-    header_row += "</div>"
-    ret += header_row
+    ret.append("<div class='row'><div class='tcell header'></div>")
+    for col_idx, transition in enumerate(transitions):
+        ret.append(cell(transition, 0, col_idx+1, 'tcell header'))
+    ret.append("</div>")
     # ... body
-    for row_idx in range(len(states)):
-        state = states[row_idx]
-        row = f"<div class='row' {row_style}>" + cell(state, row_idx+1, 0)
-        state_transitions = transition_map[state]
+    state_names, columns = fsm.state_names, fsm.columns
+    for row_idx, state in enumerate(states):
+        ret.append("<div class='row'>")
+        ret.append(cell(state, row_idx+1, 0))
+        state_id = fsm.rows[row_idx]
         for col_idx in range(len(transitions)):
-            transition = transitions[col_idx]
-            next_state = "" if (transition not in state_transitions) else state_transitions[transition]
-            row += cell(next_state, row_idx+1, col_idx+1)
-        ret += row + row_syms(row_idx) + "</div>"
+            next_state_id = fsm.get_next_state(state_id, columns[col_idx])
+            next_state = "" if (next_state_id == NO_STATE) else state_names[next_state_id]
+            ret.append(cell(next_state, row_idx+1, col_idx+1))
+        ret.append(row_syms(row_idx))
+        ret.append("</div>")
     # ... footer
-    adjustements_row = f"<div class='col_adjustments' {row_style}><div {column_style}></div>"
+    ret.append("<div class='col_adjustments'><div></div>")
     for col_idx in range(len(transitions)):
-        adjustements_row += f"<div {column_style}>" + col_syms(col_idx+1) + "</div>"
-    adjustements_row += "</div>"
-    ret += adjustements_row
-    ret += "<div><input type='button' name='update' value='Update' /><input type='button' name='update_and_clear' value='Clear Empty'></div>"
-
-    return ret
-
-def populate_graph(table_vals:dict[str,list[list[str]]] = None) -> str:
-    fsm_name, table_vals, states, transitions, transition_map = parse_table(table_vals)
-    states = list(filter(lambda s: s != "", states))
-
-    # get some dimensions
-    r1, r2, rself = 40, 200, 25
-    size = r2*2 + r1*2 + rself*4 + 20*2
-    center = size / 2
-    angle = 2*math.pi / len(states)
-    _, text_height = css_get_size("div.diagram text")
-    pcenter = geo.Pxy(center, center)
-
-    # prep
-    ret = f"<svg width='{size}' height='{size}'>"
-
-    # draw some circles!
-    state_pos = {}
-    state_intersections = {}
-    for state_idx in range(len(states)):
-        state = states[state_idx]
-        p = geo.rad_to_cart(angle * state_idx, r2, center)
-        state_pos[state] = p
-        ret += f"<circle cx='{p.x}' cy='{p.y}' r='{r1}' />"
-        i1, i2 = geo.circle_intersections([center, center, r2], [p.x, p.y, r1])
-        i3, i4 = geo.circle_vector_intersections([center, center, r2], angle*state_idx, r2-r1, r2+r1)
-        i5, i6 = geo.circle_intersections([center, center, r2+25], [p.x, p.y, r1])
-        state_intersections[state] = { "left": i1, "right": i2, "inside": i3, "outside": i4, "outer_left": i5, "outer_right": i6}
-
-    # helper functions
-    transition_texts : dict[geo.Pxy,list[str]] = {}
-    def add_transition_text(p1: geo.Pxy, sval: str):
-        for p2, svals in transition_texts.items():
-            if p1.dist(p2) < 10:
-                svals.append(sval)
-                return
-        transition_texts[p1] = [sval]
-    def draw_arc(xy1:geo.Pxy, xy2:geo.Pxy, circ:geo.Pxy, sval:str, ret:str, clockwise:bool=True, is_line=False) -> str:
-        """ Draws an arc, some text, and an arrow
-
-        Parameters
-        ----------
-            xy1: must be to the counter-clockwise location of xy2
-            xy2: must be to the clockwise location of xy1
-            circ: The location of the ending circle
-        """
-        # draw the arc
-        if is_line:
-            ret += f"<path d='M {xy1.x} {xy1.y} L {xy2.x} {xy2.y}' />"
-        elif xy1 != xy2:
-            radius = r2 if clockwise else r2+25
-            ret += f"<path d='M {xy1.x} {xy1.y} A {radius} {radius} 0 0 1 {xy2.x} {xy2.y}' />"
-        else:
-            self_rad = geo.cart_to_rad(pcenter, xy1)
-            pself = geo.rad_to_cart(geo.Rad(self_rad.radians, r2+r1+rself), centerx=center, centery=center)
-            ret += f"<circle class='arc' cx='{pself.x}' cy='{pself.y}' r='{rself}' />"
-
-        # add the text
-        if is_line:
-            xdist, ydist = xy1.xdist(xy2), xy1.ydist(xy2)
-            mid = geo.Pxy(xy1.x + xdist*3/4, xy1.y + ydist*3/4)
-            add_transition_text(mid, sval)
-        elif xy1 != xy2: # self-referencing circle
-            sval_rad = geo.Rad(3/4, -25) if clockwise else geo.Rad(1/4, 50)
-            rad1 = geo.cart_to_rad(pcenter, xy1)
-            rad2 = geo.cart_to_rad(pcenter, xy2)
-            rad_mid = geo.Rad(rad1.radians + (rad2.radians - rad1.radians) * sval_rad.radians, r2 + sval_rad.dist)
-            mid = geo.rad_to_cart(rad_mid, centerx=center, centery=center)
-            add_transition_text(mid, sval)
-        else:
-            add_transition_text(pself, sval)
-
-        # draw an arrow
-        arr_width = math.pi / 4
-        arr_length = 10
-        arr_pnts = [None, None, None]
-        arr_pnts[1] = xy2 if clockwise else xy1
-        arr_rad = geo.cart_to_rad(circ, arr_pnts[1])
-        if xy1 == xy2:
-            arr_rad = geo.Rad(arr_rad.radians + math.pi*5/11, arr_rad.dist) # for self-referencing circles
-        elif is_line:
-            arr_rad = geo.cart_to_rad(xy2, xy1)
-        elif clockwise:
-            arr_rad = geo.Rad(arr_rad.radians - math.pi/25, arr_rad.dist) # who knows why this is needed
-        else:
-            arr_rad = geo.Rad(arr_rad.radians + math.pi*9/13, arr_rad.dist) # who knows why this is needed
-        arr_start_rad = geo.Rad(arr_rad.radians + arr_width/2, arr_length)
-        arr_stop_rad = geo.Rad(arr_rad.radians - arr_width/2, arr_length)
-        arr_pnts[0] = geo.rad_to_cart(arr_start_rad, centerx=arr_pnts[1].x, centery=arr_pnts[1].y)
-        arr_pnts[2] = geo.rad_to_cart(arr_stop_rad, centerx=arr_pnts[1].x, centery=arr_pnts[1].y)
-        ret += f"<path d='M {arr_pnts[0].x} {arr_pnts[0].y} L {arr_pnts[1].x} {arr_pnts[1].y} L {arr_pnts[2].x} {arr_pnts[2].y}' />"
-
+        ret.append("<div>" + col_syms(col_idx+1) + "</div>")
+    ret.append("</div>")
+    ret.append("<div><input type='button' name='update' value='Update' /><input type='button' name='update_and_clear' value='Clear Empty'></div>")
+
+    return "".join(ret)
+
+def populate_graph(table_vals:dict[str,list[list[str]]] = None, parsed:FSM = None, layout:str = None) -> str:
+    check_admission(table_vals, max_states, max_transitions)
+    if parsed is None:
+        parsed = parse_table(table_vals)
+    return render_cache.get_or_compute(("graph", parsed.fingerprint(), layout, css_version()),
+                                      lambda: render_pool.run(render_graph, parsed, layout))
+
+def populate_code(table_vals:dict[str,list[list[str]]] = None, parsed:FSM = None) -> str:
+    check_admission(table_vals, max_states, max_transitions)
+    if parsed is None:
+        parsed = parse_table(table_vals)
+    return render_cache.get_or_compute(("code", parsed.fingerprint()),
+                                      lambda: render_pool.run(render_vhdl_textarea, parsed))
+
+def within_budget(render):
+    """ Wraps a render that runs in this process so that it raises a MemoryBudgetExceeded (a 413) instead of returning
+    a result that needed more than the memory_budget. Used inside of render_cache.get_or_compute(), so that renders
+    over the budget are never cached. The graph and code renders are checked by the render_pool instead. """
+    if memory_budget is None:
+        return render
+    def wrapper():
+        with PeakMemory() as peak_memory:
+            ret = render()
+        check_memory_budget(peak_memory.peak, memory_budget)
         return ret
-
-    # draw some transitions!
-    for state1 in states:
-        try:
-            state1_idx = states.index(state1)
-        except ValueError:
-            continue
-        for transition, state2 in transition_map[state1].items():
-            try:
-                state2_idx = states.index(state2)
-            except ValueError:
-                continue
-
-            if (state1_idx == state2_idx):
-                # self-transition
-                xy1 = state_intersections[state1]["outside"]
-                circ = state_pos[state1]
-                ret += draw_arc(xy1, xy1, circ, sval=transition, ret=ret)
-            elif (transition != "reset") and ((state2_idx == state1_idx+1) or (state2_idx == 0 and state1_idx == len(states)-1)):
-                # draw a clockwise arc
-                xy1 = state_intersections[state1]["right"]
-                xy2 = state_intersections[state2]["left"]
-                circ = state_pos[state2]
-                ret += draw_arc(xy1, xy2, circ, sval=transition, ret=ret)
-            elif (transition != "reset") and ((state1_idx == state2_idx+1) or (state1_idx == 0 and state2_idx == len(states)-1)):
-                # draw a counter-clockwise arc
-                xy1 = state_intersections[state2]["outer_right"]
-                xy2 = state_intersections[state1]["outer_left"]
-                circ = state_pos[state1]
-                ret += draw_arc(xy1, xy2, circ, sval=transition, ret=ret, clockwise=False)
-            else:
-                # draw an inside arc
-                xy1 = state_intersections[state1]["inside"]
-                xy2 = state_intersections[state2]["inside"]
-                circ = state_pos[state2]
-                ret += draw_arc(xy1, xy2, circ, sval=transition, ret=ret, is_line=True)
-
-    # add some text!
-    for state_idx, state in enumerate(states):
-        p = state_pos[state]
-        ret += f"<text x='{p.x}' y='{p.y+5}'>{state}</text>"
-    for p1, svals in transition_texts.items():
-        svals = list(filter(lambda s: s.replace("_","") != "", svals))
-        y_start = text_height * (len(svals)-1) / 2
-        for idx, sval in enumerate(svals):
-            p2 = geo.Pxy(p1.x, p1.y - y_start + text_height*idx)
-            ret += f"<text x='{p2.x}' y='{p2.y+5}'>{sval}</text>"
-
-    ret += "</svg>"
-    return ret
-
-def populate_code(table_vals:dict[str,list[list[str]]] = None) -> str:
-    table_vals_str = str(table_vals)
-    fsm_name, table_vals, states, transitions, transition_map = parse_table(table_vals)
-    transition_empty = lambda s: s.replace("_","") == ""
-    nonempty_transitions = list(filter(lambda s: not transition_empty(s), transitions))
-    s = "   "
-
-    ret = f"-----------------------------------------------------------\n" \
-          f"-- FSM created with https://github.com/gladclef/FSMs\n" \
-          f"-- {table_vals_str}\n" \
-          f"-----------------------------------------------------------\n" \
-          f"\n" \
-          f"library IEEE;\n" \
-          f"use IEEE.STD_LOGIC_1164.ALL;\n" \
-          f"use IEEE.NUMERIC_STD.ALL;\n" \
-          f"\n" \
-          f"entity {fsm_name} is\n" \
-          f"{s*1}Port (\n" \
-          f"{s*2}reset : in std_logic;\n" \
-          f"{s*2}clk : in std_logic\n" \
-          f"{s*1});\n" \
-          f"end {fsm_name};\n" \
-          f"\n" \
-          f"architecture rtl of {fsm_name} is\n"
-    ret += f"{s*1}type state_type is ({', '.join(states)});\n" \
-           f"{s*1}-- other type declarations\n" \
-           f"\n" \
-           f"{s*1}signal state_reg, state_next: state_type;\n"
-    for transition in nonempty_transitions:
-        if transition != "reset":
-            ret += f"{s*1}signal {transition}: std_logic;\n"
-    ret += f"{s*1}-- other signal declarations\n" \
-           f"begin\n" \
-           f"\n" \
-           f"{s*1}-- state and data register\n" \
-           f"{s*1}process(clk, reset)\n" \
-           f"{s*1}begin\n" \
-           f"{s*2}if (reset = '1') then\n" \
-           f"{s*3}state_reg <= {states[0]};\n" \
-           f"{s*2}elsif (rising_edge(clk)) then\n" \
-           f"{s*2}   state_reg <= state_next;\n" \
-           f"{s*2}end if;\n" \
-           f"{s*1}end process;\n" \
-           f"\n" \
-           f"{s*1}-- combinational circuit\n" \
-           f"{s*1}process(state_reg, {', '.join(nonempty_transitions)})\n" \
-           f"{s*1}begin\n" \
-           f"{s*2}state_next <= state_reg;\n" \
-           f"\n" \
-           f"{s*2}case state_reg is\n"
-
-    for state in states:
-        ret += f"{s*3}when {state} =>\n" \
-               f"{s*4}-- state logic\n"
-        first_transition = True
-        for transition, state_next in transition_map[state].items():
-            if not transition_empty(transition):
-                ifstr = "if" if first_transition else "elsif"
-                ret += f"{s*4}{ifstr} ({transition} = '1') then\n" \
-                       f"{s*5}state_next <= {state_next};\n"
-                first_transition = False
-            elif first_transition:
-                ret += f"{s*4}state_next <= {state_next};\n"
-            else:
-                ret += f"{s*4}else\n" \
-                       f"{s*5}state_next <= {state_next};\n"
-        if not first_transition:
-            ret += f"{s*4}end if;\n" \
-                   f"\n"
-        else:
-            ret += f"\n"
-
-    ret += f"{s*2}end case;\n" \
-           f"{s*1}end process;\n" \
-           f"\n"
-
-    i = 0
-    state_nb = math.ceil(math.log2(len(states)))
-    align_space = " "*7
-    for i, state in enumerate(states):
-        if i == 0:
-            ret += f"{s*1}-- dbg <= \"{'0'*state_nb}\" when state_reg = {state} else\n"
-            continue
-        bits = ("{0:0"+str(state_nb)+"b}").format(i)
-        ret += f"{s*1}-- {align_space}\"{bits}\" when state_reg = {state} else\n"
-    bits = ("{0:0"+str(state_nb)+"b}").format( 2**state_nb-1 )
-    ret += f"{s*1}-- {align_space}\"{bits}\";\n" \
-           "\n"
-
-    ret += f"end rtl;\n"
-
-    linecnt = len(ret.split('\n'))
-    return f"<textarea rows='{linecnt}' cols='80'>{ret}</textarea>"
+    return wrapper
+
+def memory_traced(route):
+    """ Records the peak memory of the route in the metrics when trace_memory is on. Tracing slows down every
+    allocation in the process, so it is off by default. The budget is enforced per render, see within_budget(). """
+    @functools.wraps(route)
+    def wrapper(*args, **kwargs):
+        if not trace_memory:
+            return route(*args, **kwargs)
+        with PeakMemory() as peak_memory:
+            response = route(*args, **kwargs)
+        metrics.observe("fsms_request_peak_bytes", peak_memory.peak, endpoint=request.endpoint)
+        return response
+    return wrapper
+
+def conditional_json(etag: str, render) -> Response:
+    """ Responds with the json of render() and its etag, or with an empty 304 Not Modified (without rendering) when the
+    client sent the same etag in If-None-Match. The etags are based on the fingerprint of the parsed FSM, so edits that
+    don't change the parsed FSM aren't rendered or sent again, and on css_version() for the panes that are sized by
+    the stylesheet. Responses with "errors" don't get an etag, so that the
+    client asks for them again. """
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        rendered = render()
+        response = jsonify(rendered)
+        if isinstance(rendered, dict) and ("errors" in rendered):
+            return response
+    response.set_etag(etag)
+    return response
 
 @app.route('/update_fsm_name', methods=['POST'])
 def update_fsm_name():
     if request.method == 'POST':
         inputs = request.json['inputs']
-        fsm_name_str = populate_fsm_name(inputs)
-        return jsonify(fsm_name_str)
+        check_admission(inputs, None, None) # only checks that the inputs are a table
+        parsed = parse_table(inputs)
+        return conditional_json(f"name-{parsed.fingerprint()}", lambda: populate_fsm_name(inputs, parsed=parsed))
 
 @app.route('/update_table', methods=['POST'])
+@memory_traced
 def update_table():
     if request.method == 'POST':
         inputs = request.json['inputs']
         clear_emtpy = request.json['clear_emtpy']
-        table_str = populate_table(inputs, clear_emtpy)
-        return jsonify(table_str)
+        check_admission(inputs, None, None)
+        parsed = parse_table(inputs, clear_emtpy)
+        return conditional_json(f"table-{parsed.fingerprint()}-{css_version()}",
+                                lambda: populate_table(inputs, clear_emtpy, parsed=parsed))
 
 @app.route('/update_graph', methods=['POST'])
+@memory_traced
 def update_graph():
     if request.method == 'POST':
         inputs = request.json['inputs']
-        graph_str = populate_graph(inputs)
-        return jsonify(graph_str)
+        layout = request.json.get('layout')
+        check_layout(layout)
+        check_admission(inputs, max_states, max_transitions)
+        parsed = parse_table(inputs)
+        return conditional_json(f"graph-{parsed.fingerprint()}-{layout}-{css_version()}",
+                                lambda: populate_graph(inputs, parsed=parsed, layout=layout))
 
 @app.route('/update_code', methods=['POST'])
+@memory_traced
 def update_code():
     if request.method == 'POST':
         inputs = request.json['inputs']
-        graph_str = populate_code(inputs)
-        return jsonify(graph_str)
+        check_admission(inputs, max_states, max_transitions)
+        parsed = parse_table(inputs)
+        return conditional_json(f"code-{parsed.fingerprint()}", lambda: populate_code(inputs, parsed=parsed))
+
+@app.route('/api/fsm', methods=['POST'])
+def api_fsm():
+    """ The parsed FSM as compact JSON, see FSM.to_json(). """
+    if request.method == 'POST':
+        inputs = request.json['inputs']
+        check_admission(inputs, max_states, max_transitions)
+        parsed = parse_table(inputs, request.json.get('clear_emtpy', False))
+        return conditional_json(f"api-{parsed.fingerprint()}", parsed.to_json)
+
+@app.route('/download_code', methods=['POST'])
+def download_code():
+    """ Streams the generated VHDL as a .vhd file, without building the whole file in memory. """
+    if request.method == 'POST':
+        inputs = request.json['inputs']
+        check_admission(inputs, max_states, max_transitions)
+        fsm = parse_table(inputs)
+        chunks = vhdl_chunks(fsm)
+        headers = {"Content-Disposition": f"attachment; filename={fsm.name}.vhd"}
+        return Response(chunks, mimetype='text/plain', headers=headers)
+
+@app.route('/update_all', methods=['POST'])
+@memory_traced
+def update_all():
+    """ Parses the inputs once and renders every pane from the same parsed FSM. Each pane is rendered on its own, and
+    the panes that couldn't be rendered are left out and described in "errors" instead (eg a graph that is too large),
+    so that one pane failing doesn't stop the others from updating. """
+    if request.method == 'POST':
+        inputs = request.json['inputs']
+        clear_emtpy = request.json.get('clear_emtpy', False)
+        layout = request.json.get('layout')
+        check_layout(layout)
+        check_admission(inputs, None, None)
+        parsed = parse_table(inputs, clear_emtpy)
+        panes = {
+            "fsm_name": lambda: populate_fsm_name(inputs, parsed=parsed),
+            "table": lambda: populate_table(inputs, clear_emtpy, parsed=parsed),
+            "graph": lambda: populate_graph(inputs, parsed=parsed, layout=layout),
+            "code": lambda: populate_code(inputs, parsed=parsed),
+        }
+        def render() -> dict[str, str | dict[str, str]]:
+            ret, errors = {}, {}
+            for pane, populate in panes.items():
+                try:
+                    ret[pane] = populate()
+                except (AdmissionError, RenderUnavailable) as ex:
+                    errors[pane] = str(ex)
+                except Exception:
+                    app.logger.exception(f"Unable to render the {pane} pane")
+                    errors[pane] = f"Unable to render the {pane}"
+            if len(errors) > 0:
+                ret["errors"] = errors
+            return ret
+        return conditional_json(f"all-{parsed.fingerprint()}-{layout}-{css_version()}", render)
+
+@app.route('/import_vhdl', methods=['POST'])
+def import_vhdl():
+    """ Parses the state machine of an uploaded .vhd file (as the "file" of a form, or as the request body) into the
+    same {'fsm_name': ..., 'table_vals': ...} inputs that the other endpoints accept. """
+    if request.method == 'POST':
+        if (max_import_size is not None) and ((request.content_length or 0) > max_import_size):
+            raise AdmissionError(f"The file is {request.content_length} bytes, the largest that can be imported is "
+                                 f"{max_import_size}")
+        upload = request.files.get('file')
+        vhdl = upload.read() if (upload is not None) else request.get_data()
+        if (max_import_size is not None) and (len(vhdl) > max_import_size):
+            raise AdmissionError(f"The file is {len(vhdl)} bytes, the largest that can be imported is {max_import_size}")
+
+        file_hash = hashlib.sha1(vhdl).hexdigest()
+        inputs = import_cache.get_or_compute(file_hash, lambda: render_pool.run(
+            fsm_table_from_vhdl, vhdl.decode("utf-8", errors="replace")))
+        check_admission(inputs, max_states, max_transitions)
+        return conditional_json(f"import-{file_hash}", lambda: {"inputs": inputs})
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """ Request latencies and render stage times, in the Prometheus text format. Set FSMS_METRICS=0 to turn off. """
+    if not metrics.enabled:
+        return Response("metrics are disabled\n", status=404, mimetype='text/plain')
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+# the rendered default page: (mtimes of the template and stylesheet it was rendered from, page, etag)
+_default_page: tuple[tuple[int, ...], str, str] | None = None
+_default_page_lock = threading.Lock()
+
+def default_page() -> tuple[str, str]:
+    """ The rendered default page and its etag. The page is only rendered on the first request, and again whenever
+    the template or the stylesheet changes. """
+    global _default_page
+    mtimes = (os.stat(os.path.join(app.root_path, app.template_folder, "main.html")).st_mtime_ns, css_version())
+    with _default_page_lock:
+        if (_default_page is None) or (_default_page[0] != mtimes):
+            page = render_template('main.html', populate_fsm_name=populate_fsm_name, populate_table=populate_table, populate_diagram=populate_graph, populate_code=populate_code, layout_engines=LAYOUT_ENGINES)
+            _default_page = (mtimes, page, hashlib.sha1(page.encode()).hexdigest())
+        return _default_page[1], _default_page[2]
 
 @app.route('/', methods=['GET'])
 def login():
     if request.method == 'GET':
-        return render_template('main.html', populate_fsm_name=populate_fsm_name, populate_table=populate_table, populate_diagram=populate_graph, populate_code=populate_code)
+        page, etag = default_page()
+        response = Response(page, mimetype='text/html')
+        response.set_etag(etag)
+        response.cache_control.no_cache = True # always revalidate, the page changes with the template
+        return response.make_conditional(request)
 
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
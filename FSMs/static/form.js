@@ -1,4 +1,4 @@
-function post(url, vals, on_failure, on_success)
+function post(url, vals, on_failure, on_success, headers)
 {
     $.ajax({
         type: "POST",
@@ -6,7 +6,8 @@ function post(url, vals, on_failure, on_success)
         data: JSON.stringify(vals),
         contentType: "application/json",
         dataType: 'json',
-        success: on_success, //(result)
+        headers: headers || {},
+        success: on_success, //(result, textStatus, jqXHR), textStatus is "notmodified" for a 304 response
         error: on_failure, //(jqXHR, textStatus, errorThrown)
     });
 }
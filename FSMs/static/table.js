@@ -72,6 +72,27 @@ function saveme_changed() {
     _update(vals, false );
 }
 
+function import_vhdl(jfile_input) {
+    /** Replaces the FSM with the state machine of the .vhd file chosen in the given file input. */
+    let file = jfile_input.files[0];
+    if (file == null) {
+        return;
+    }
+    let data = new FormData();
+    data.append("file", file);
+    $.ajax({
+        type: "POST",
+        url: "/import_vhdl",
+        data: data,
+        processData: false,
+        contentType: false,
+        dataType: 'json',
+        success: (results) => _update(results["inputs"], false),
+        error: (jqXHR) => alert((jqXHR.responseJSON || {})["error"] || "Unable to import " + file.name),
+    });
+    jfile_input.value = "";
+}
+
 function fsm_name_key_up(jfsm_name, key) {
     console.log('fsm_name_key_up');
 
@@ -149,12 +170,29 @@ function update_with_clear_empty() {
     _update(get_inputs(), true)
 }
 
+latest_update_etag = null; // the server's fingerprint of the last FSM that was rendered
 function _update(inputs, clear_empty) {
     console.log("_update");
-    post("/update_table", {"inputs": inputs, "clear_emtpy": clear_empty}, null, form_set('table', true, attach_table_handles));
-    post("/update_fsm_name", {"inputs": inputs}, null, form_set('fsm_name_container', true, attach_fsm_name_handles));
-    post("/update_graph", {"inputs": inputs}, null, form_set('diagram', true));
-    post("/update_code", {"inputs": inputs}, null, form_set('code', true));
+    let set_table = form_set('table', true, attach_table_handles);
+    let set_fsm_name = form_set('fsm_name_container', true, attach_fsm_name_handles);
+    let set_diagram = form_set('diagram', true);
+    let set_code = form_set('code', true);
+    let headers = (latest_update_etag === null) ? {} : {"If-None-Match": latest_update_etag};
+    let layout = $('[name=layout]').val() || null; // null for the default layout
+    post("/update_all", {"inputs": inputs, "clear_emtpy": clear_empty, "layout": layout}, null, (results, status, jqXHR) => {
+        if (status === "notmodified") {
+            return; // the parsed FSM didn't change, so neither did any of the panes
+        }
+        latest_update_etag = jqXHR.getResponseHeader("ETag"); // not set when any of the panes failed
+        let panes = [["table", set_table], ["fsm_name", set_fsm_name], ["graph", set_diagram], ["code", set_code]];
+        for (let [pane, set_pane] of panes) {
+            if (pane in results) {
+                set_pane(results[pane]);
+            } else {
+                console.log("Unable to update the " + pane + ": " + results["errors"][pane]);
+            }
+        }
+    }, headers);
 
     dont_update_on_saveme_changed = true;
     $('[name=saveme_tvals]').val(JSON.stringify(inputs));
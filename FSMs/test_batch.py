@@ -0,0 +1,48 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+from FSMs import batch
+from FSMs.lib.vhdl import NoStates
+
+SPEC = {"fsm_name": "fsm", "table_vals": [["", "go"], ["IDLE", "WORK"], ["WORK", "IDLE"]]}
+
+
+class Test(TestCase):
+    def test_bad_specs(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            source = os.path.join(tmp_dir, "specs.jsonl")
+            with open(source, "w") as fout:
+                fout.write(json.dumps(SPEC) + "\n")
+                fout.write("{not json\n")
+                fout.write("[1, 2]\n")
+                fout.write(json.dumps(SPEC) + "\n")
+            out_dir = os.path.join(tmp_dir, "out")
+            stderr = io.StringIO()
+            with contextlib.redirect_stderr(stderr), contextlib.redirect_stdout(io.StringIO()):
+                self.assertEqual(1, batch.main([source, "-o", out_dir, "-j", "1", "--no-svg"]))
+
+            # the specs around the bad lines are still generated
+            self.assertEqual(["fsm.vhd", "fsm_1.vhd"], sorted(os.listdir(out_dir)))
+            self.assertIn("specs.jsonl:2", stderr.getvalue())
+            self.assertIn("specs.jsonl:3", stderr.getvalue())
+
+    def test_out_names(self):
+        out_names = batch._OutNames()
+        specs = [SPEC, SPEC, dict(SPEC, fsm_name="fsm_1"), dict(SPEC, fsm_name="fsm 2"), SPEC]
+        self.assertEqual(["fsm", "fsm_1", "fsm_1_1", "fsm_2", "fsm_3"], [out_names.next(spec) for spec in specs])
+
+    def test_failed_spec_leaves_no_files(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with self.assertRaises(NoStates):
+                batch.generate({"fsm_name": "empty", "table_vals": []}, tmp_dir, "empty")
+            self.assertEqual([], os.listdir(tmp_dir))
+
+    def test_bad_layout(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with contextlib.redirect_stderr(io.StringIO()), self.assertRaises(SystemExit):
+                batch.main([tmp_dir, "-o", os.path.join(tmp_dir, "out"), "--layout", "bogus"])
+            self.assertFalse(os.path.exists(os.path.join(tmp_dir, "out")))
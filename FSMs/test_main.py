@@ -0,0 +1,287 @@
+import io
+import os
+import shutil
+import tempfile
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase, mock
+
+from FSMs import main
+from FSMs.lib import css
+from FSMs.lib.metrics import metrics
+from FSMs.lib.render_pool import RenderPool
+
+DOOR_VHDL = (b"entity door is\n"
+             b"end door;\n"
+             b"architecture rtl of door is\n"
+             b"begin\n"
+             b"   process(state_reg, open_btn)\n"
+             b"   begin\n"
+             b"      case state_reg is\n"
+             b"         when closed =>\n"
+             b"            if (open_btn = '1') then\n"
+             b"               state_next <= opened;\n"
+             b"            end if;\n"
+             b"         when opened =>\n"
+             b"            state_next <= closed;\n"
+             b"      end case;\n"
+             b"   end process;\n"
+             b"end rtl;\n")
+
+
+class Test(TestCase):
+    def setUp(self):
+        self.render_pool, self.max_import_size = main.render_pool, main.max_import_size
+        main.render_pool = RenderPool(max_workers=0)
+        main.import_cache.clear()
+        main.render_cache.clear()
+        self.client = main.app.test_client()
+
+    def tearDown(self):
+        main.render_pool, main.max_import_size = self.render_pool, self.max_import_size
+
+    def use_stylesheet_copy(self) -> str:
+        """ Renders with a copy of main.css, so that the tests can change it. Returns the path of the copy. """
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        css_path = shutil.copy(css._css_path, os.path.join(tmp_dir.name, "main.css"))
+        css_path_orig = css._css_path
+        css._css_path = css_path
+        self.addCleanup(setattr, css, "_css_path", css_path_orig)
+        return css_path
+
+    def touch(self, path: str):
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+
+    def test_update_not_modified(self):
+        css_path = self.use_stylesheet_copy()
+        requests = [('/update_fsm_name', {}), ('/update_table', {"clear_emtpy": False}), ('/update_graph', {}),
+                    ('/update_code', {}), ('/update_all', {})]
+        post = lambda endpoint, args, **kwargs: self.client.post(endpoint, json={"inputs": None, **args}, **kwargs)
+        etags = {}
+        for endpoint, args in requests:
+            response = post(endpoint, args)
+            self.assertEqual(200, response.status_code)
+            etags[endpoint] = response.headers["ETag"]
+            response = post(endpoint, args, headers={"If-None-Match": etags[endpoint]})
+            self.assertEqual(304, response.status_code)
+            self.assertEqual(b"", response.data)
+
+        # the table and graph are sized by the stylesheet, so they are sent again when it changes
+        self.touch(css_path)
+        for endpoint, args in requests:
+            response = post(endpoint, args, headers={"If-None-Match": etags[endpoint]})
+            expected = 200 if endpoint in ('/update_table', '/update_graph', '/update_all') else 304
+            self.assertEqual(expected, response.status_code, endpoint)
+
+    def test_update_all(self):
+        response = self.client.post('/update_all', json={"inputs": None})
+        self.assertEqual(200, response.status_code)
+        self.assertEqual({"fsm_name", "table", "graph", "code"}, set(response.json))
+        self.assertIsNotNone(response.headers.get("ETag"))
+
+    def test_update_all_pane_errors(self):
+        # a pane that can't be rendered doesn't stop the others
+        inputs = {"fsm_name": "fsm", "table_vals": [["", "go"], ["IDLE", "WORK"], ["WORK", "IDLE"]]}
+        max_states = main.max_states
+        main.max_states = 1
+        try:
+            response = self.client.post('/update_all', json={"inputs": inputs})
+        finally:
+            main.max_states = max_states
+        self.assertEqual(200, response.status_code)
+        self.assertEqual({"fsm_name", "table", "errors"}, set(response.json))
+        self.assertEqual({"graph", "code"}, set(response.json["errors"]))
+        self.assertIn("2 states", response.json["errors"]["graph"])
+        self.assertIsNone(response.headers.get("ETag"))
+
+        # there is no code for an empty table, but the other panes are still updated
+        empty = {"fsm_name": "fsm", "table_vals": [["", ""], ["", ""]]}
+        response = self.client.post('/update_all', json={"inputs": empty, "clear_emtpy": True})
+        self.assertEqual(200, response.status_code)
+        self.assertEqual({"code"}, set(response.json["errors"]))
+        self.assertEqual("<svg width='0' height='0'></svg>", response.json["graph"])
+
+    def test_unknown_layout(self):
+        for endpoint in ('/update_graph', '/update_all'):
+            response = self.client.post(endpoint, json={"inputs": None, "layout": "bogus"})
+            self.assertEqual(400, response.status_code)
+            self.assertIn("bogus", response.json["error"])
+        response = self.client.post('/update_graph', json={"inputs": None, "layout": "force"})
+        self.assertEqual(200, response.status_code)
+
+    def test_admission(self):
+        inputs = {"fsm_name": "fsm", "table_vals": [["", "go"], ["IDLE", "WORK"], ["WORK", "IDLE"]]}
+        max_states = main.max_states
+        main.max_states = 1
+        try:
+            for endpoint in ('/update_graph', '/update_code', '/api/fsm', '/download_code'):
+                self.assertEqual(413, self.client.post(endpoint, json={"inputs": inputs}).status_code)
+        finally:
+            main.max_states = max_states
+        self.assertEqual(200, self.client.post('/download_code', json={"inputs": inputs}).status_code)
+
+        # inputs that aren't a table at all are a bad request, rather than an error in the app
+        for endpoint in ('/update_fsm_name', '/update_table', '/update_graph', '/update_code', '/update_all', '/api/fsm',
+                         '/download_code'):
+            response = self.client.post(endpoint, json={"inputs": {"fsm_name": "fsm"}, "clear_emtpy": False})
+            self.assertEqual(400, response.status_code)
+            self.assertIn("table_vals", response.json["error"])
+
+    def test_api_fsm(self):
+        inputs = {"fsm_name": "fsm", "table_vals": [["", "go", "stop"], ["IDLE", "WORK", ""], ["WORK", "", "IDLE"]]}
+        response = self.client.post('/api/fsm', json={"inputs": inputs})
+        self.assertEqual(200, response.status_code)
+        payload = response.json
+        fingerprint = payload.pop("fingerprint")
+        self.assertEqual({"fsm_name": "fsm", "states": ["IDLE", "WORK"], "transitions": ["go", "stop"],
+                          "rows": [0, 1], "columns": [0, 1], "next_states": [[1, -1], [-1, 0]]}, payload)
+        self.assertEqual(f'"api-{fingerprint}"', response.headers["ETag"])
+
+        response = self.client.post('/api/fsm', json={"inputs": inputs}, headers={"If-None-Match": f'"api-{fingerprint}"'})
+        self.assertEqual(304, response.status_code)
+        self.assertEqual(b"", response.data)
+
+        # a different machine doesn't match the etag
+        inputs["table_vals"][1][1] = "IDLE"
+        response = self.client.post('/api/fsm', json={"inputs": inputs}, headers={"If-None-Match": f'"api-{fingerprint}"'})
+        self.assertEqual(200, response.status_code)
+        self.assertEqual([[0, -1], [-1, 0]], response.json["next_states"])
+
+    def test_download_code(self):
+        inputs = {"fsm_name": "fsm", "table_vals": [["", "go"], ["IDLE", "WORK"], ["WORK", "IDLE"]]}
+        response = self.client.post('/download_code', json={"inputs": inputs})
+        self.assertEqual(200, response.status_code)
+        self.assertEqual("attachment; filename=fsm.vhd", response.headers["Content-Disposition"])
+        self.assertTrue(response.get_data(as_text=True).endswith("end rtl;\n"))
+
+        # a table without any states is rejected before the download starts, instead of being cut short
+        response = self.client.post('/download_code', json={"inputs": {"fsm_name": "a", "table_vals": [["", "a"]]}})
+        self.assertEqual(400, response.status_code)
+        self.assertIn("states", response.json["error"])
+
+    def test_memory_budget(self):
+        memory_budget, trace_memory = main.memory_budget, main.trace_memory
+        main.memory_budget, main.trace_memory = 64 * 1024, True
+        main.render_pool = RenderPool(max_workers=0, memory_budget=main.memory_budget)
+        try:
+            # renders over the budget aren't cached, so asking again doesn't get around the budget
+            states = [f"S{i}" for i in range(100)]
+            inputs = {"fsm_name": "dense", "table_vals": [[""] + [f"t{j}" for j in range(10)]] +
+                      [[state] + [states[(i*7 + j) % 100] for j in range(10)] for i, state in enumerate(states)]}
+            statuses = [self.client.post('/update_graph', json={"inputs": inputs}).status_code for _ in range(2)]
+            self.assertEqual([413, 413], statuses)
+            self.assertEqual(0, len(main.render_cache))
+        finally:
+            main.memory_budget, main.trace_memory = memory_budget, trace_memory
+            tracemalloc.stop()
+
+    def test_memory_budget_concurrent(self):
+        # a traced request that is waiting for another request's render (or the other way around) must not deadlock
+        memory_budget, trace_memory = main.memory_budget, main.trace_memory
+        main.memory_budget, main.trace_memory = 512 * 1024**2, True
+        main.render_pool = RenderPool(max_workers=0, memory_budget=main.memory_budget)
+        main._default_page = None
+        try:
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                for _ in range(10):
+                    main.render_cache.clear()
+                    main._default_page = None
+                    futures = [executor.submit(main.app.test_client().get, '/') for _ in range(4)]
+                    futures += [executor.submit(main.app.test_client().post, '/update_graph', json={"inputs": None})
+                                for _ in range(4)]
+                    for future in futures:
+                        self.assertEqual(200, future.result(timeout=30).status_code)
+        finally:
+            main.memory_budget, main.trace_memory = memory_budget, trace_memory
+            main._default_page = None
+            tracemalloc.stop()
+
+    def test_stylesheet_changes(self):
+        # renders that are sized by the stylesheet are rendered again when it changes
+        css_path = self.use_stylesheet_copy()
+        main.populate_table(None)
+        main.populate_table(None)
+        self.assertEqual(1, main.render_cache.stats()["misses"])
+        self.touch(css_path)
+        main.populate_table(None)
+        self.assertEqual(2, main.render_cache.stats()["misses"])
+
+    def test_default_page(self):
+        css_path = self.use_stylesheet_copy()
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        template_path = shutil.copy(os.path.join(main.app.root_path, main.app.template_folder, "main.html"),
+                                    os.path.join(tmp_dir.name, "main.html"))
+        main._default_page = None
+        self.addCleanup(setattr, main, "_default_page", None)
+
+        with mock.patch.object(main.app, "template_folder", tmp_dir.name), \
+             mock.patch.object(main, "render_template", wraps=main.render_template) as render_template:
+            response = self.client.get('/')
+            self.assertEqual(200, response.status_code)
+            etag = response.headers["ETag"]
+            response = self.client.get('/', headers={"If-None-Match": etag})
+            self.assertEqual(304, response.status_code)
+            self.assertEqual(1, render_template.call_count)
+
+            # the page is rendered again when the template or the stylesheet changes
+            for path in (template_path, css_path):
+                self.touch(path)
+                calls = render_template.call_count
+                self.assertEqual(200, self.client.get('/').status_code)
+                self.assertEqual(calls + 1, render_template.call_count)
+
+    def test_metrics(self):
+        self.assertEqual(200, self.client.post('/update_graph', json={"inputs": None}).status_code)
+        response = self.client.get('/metrics')
+        self.assertEqual(200, response.status_code)
+        self.assertEqual("text/plain; version=0.0.4; charset=utf-8", response.headers["Content-Type"])
+        lines = response.get_data(as_text=True).splitlines()
+        self.assertIn("# TYPE fsms_request_duration_seconds histogram", lines)
+        self.assertIn("# TYPE fsms_stage_duration_seconds histogram", lines)
+        self.assertIn("# TYPE fsms_render_cache_misses_total counter", lines)
+        self.assertIn("fsms_render_cache_misses_total 1", lines)
+        self.assertTrue(any(line.startswith('fsms_request_duration_seconds_count{endpoint="update_graph",status="200"} ')
+                            for line in lines))
+        self.assertTrue(any(line.startswith('fsms_stage_duration_seconds_bucket{stage="layout",le="+Inf"} ')
+                            for line in lines))
+        # every sample is a metric name, optional labels and a number
+        for line in filter(lambda line: not line.startswith("#"), lines):
+            self.assertRegex(line, r'^[a-z_]+(\{[a-z_]+="[^"]*"(,[a-z_]+="[^"]*")*\})? ')
+            float(line.rsplit(" ", 1)[1])
+
+        with mock.patch.object(metrics, "enabled", False):
+            self.assertEqual(404, self.client.get('/metrics').status_code)
+
+    def test_import_vhdl(self):
+        expected = {'fsm_name': 'door', 'table_vals': [['', 'open_btn', '__'],
+                                                       ['closed', 'opened', ''],
+                                                       ['opened', '', 'closed']]}
+        response = self.client.post('/import_vhdl', data={'file': (io.BytesIO(DOOR_VHDL), 'door.vhd')},
+                                    content_type='multipart/form-data')
+        self.assertEqual(200, response.status_code)
+        self.assertEqual({"inputs": expected}, response.json)
+
+        # the same file as the request body comes from the cache
+        response = self.client.post('/import_vhdl', data=DOOR_VHDL)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual({"inputs": expected}, response.json)
+        self.assertEqual(1, main.import_cache.stats()["hits"])
+
+        response = self.client.post('/import_vhdl', data=DOOR_VHDL, headers={"If-None-Match": response.headers["ETag"]})
+        self.assertEqual(304, response.status_code)
+
+    def test_import_vhdl_errors(self):
+        response = self.client.post('/import_vhdl', data=DOOR_VHDL.replace(b"if (open_btn = '1') then", b"else"))
+        self.assertEqual(400, response.status_code)
+        self.assertIn("line 9", response.json["error"])
+
+        response = self.client.post('/import_vhdl', data=b"entity empty is\nend empty;\n")
+        self.assertEqual(400, response.status_code)
+
+        main.max_import_size = 16
+        response = self.client.post('/import_vhdl', data=DOOR_VHDL)
+        self.assertEqual(413, response.status_code)
+        self.assertIn("error", response.json)
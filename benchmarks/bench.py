@@ -0,0 +1,176 @@
+""" Benchmarks for the FSMs web app renderers and the ASMD_generator VHDL parser.
+
+Every case is run against synthetic machines (see synthetic.py) of increasing size. The wall time is the best of
+several repeats, and the peak memory is measured with tracemalloc in a separate run so that tracing doesn't skew the
+timings. Results are written as JSON, and two result files can be compared to flag regressions.
+
+Example (from the repo's root directory):
+    python -m benchmarks.bench run -o baseline.json
+    python -m benchmarks.bench run -o current.json
+    python -m benchmarks.bench compare baseline.json current.json --threshold 0.2
+    python -m benchmarks.bench asmd --states 5000
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Iterator
+
+from FSMs.lib.fsm import parse_table
+from FSMs.lib.render_pool import RenderPool
+from FSMs.lib.vhdl import write_vhdl
+from FSMs import main as fsms_main
+from ASMD_generator import Program as asmd
+
+from .synthetic import GENERATORS, write_static_heavy_vhdl
+
+DEFAULT_SIZES = (10, 100, 1000, 10000)
+
+def _cases(spec: dict, vhd_path: str) -> Iterator[tuple[str, Callable[[], object]]]:
+    """ Yields (case name, callable) for every stage that is benchmarked against the given spec. """
+    fsm = parse_table(spec)
+    yield "parse_table", lambda: parse_table(spec)
+    yield "populate_fsm_name", lambda: fsms_main.populate_fsm_name(spec)
+    yield "populate_table", lambda: fsms_main.populate_table(spec)
+    yield "populate_graph", lambda: fsms_main.populate_graph(spec)
+    yield "populate_code", lambda: fsms_main.populate_code(spec)
+
+    with open(vhd_path, "w") as fout:
+        write_vhdl(fsm, fout)
+    program = asmd.Program(vhd_path)
+    yield "asmd_parse", lambda: asmd.Program(vhd_path)
+    yield "asmd_print", lambda: program.print(3)
+
+def _measure(func: Callable[[], object], repeats: int) -> dict[str, float]:
+    wall_times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        wall_times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {"wall_s": min(wall_times), "peak_kb": peak / 1024}
+
+def run(sizes: list[int], generators: list[str], repeats: int, verbose: bool = True) -> dict:
+    """ Runs every case against every generator and size. Returns the results, keyed by "generator/size/case". """
+    # measure the renderers, not the render cache, worker processes or admission limits
+    fsms_main.render_cache.resize(0)
+    fsms_main.render_pool = RenderPool(max_workers=0)
+    fsms_main.max_states, fsms_main.max_transitions = None, None
+
+    results: dict[str, dict[str, float]] = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        vhd_path = os.path.join(tmp_dir, "bench.vhd")
+        for generator in generators:
+            for num_states in sizes:
+                spec = GENERATORS[generator](num_states)
+                for case, func in _cases(spec, vhd_path):
+                    key = f"{generator}/{num_states}/{case}"
+                    results[key] = _measure(func, repeats)
+                    if verbose:
+                        print(f"{key:45s} {results[key]['wall_s']*1000:10.2f}ms {results[key]['peak_kb']:10.0f}KiB",
+                              file=sys.stderr)
+
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeats": repeats,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+
+def bench_asmd(num_states: int, repeats: int, generator: str = "dense_random",
+               static_lines: int = 0) -> dict[str, float]:
+    """ Times parsing one large synthetic .vhd with ASMD_generator's Program. The .vhd is generated from the FSM of the
+    given generator, or has static_lines static assignments in every state if static_lines isn't 0. """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        vhd_path = os.path.join(tmp_dir, "bench.vhd")
+        with open(vhd_path, "w") as fout:
+            if static_lines > 0:
+                num_lines = write_static_heavy_vhdl(fout, num_states, static_lines)
+            else:
+                num_lines = write_vhdl(parse_table(GENERATORS[generator](num_states)), fout)
+        result = _measure(lambda: asmd.Program(vhd_path), repeats)
+    result["lines"] = num_lines
+    result["lines_per_s"] = num_lines / result["wall_s"]
+    return result
+
+def compare(baseline: dict, current: dict, threshold: float, min_wall_s: float = 0.001) -> list[str]:
+    """ Returns a description of every result that is more than threshold (a fraction) slower or larger than the
+    baseline. Cases that take less than min_wall_s are too noisy to compare the wall times of. """
+    regressions = []
+    for key, new in current["results"].items():
+        old = baseline["results"].get(key)
+        if old is None:
+            continue
+        if max(old["wall_s"], new["wall_s"]) >= min_wall_s and new["wall_s"] > old["wall_s"] * (1 + threshold):
+            regressions.append(f"{key}: wall time {old['wall_s']*1000:.2f}ms -> {new['wall_s']*1000:.2f}ms")
+        if new["peak_kb"] > old["peak_kb"] * (1 + threshold) and new["peak_kb"] - old["peak_kb"] >= 64:
+            regressions.append(f"{key}: peak memory {old['peak_kb']:.0f}KiB -> {new['peak_kb']:.0f}KiB")
+    return regressions
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the FSM renderers and the ASMD VHDL parser.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="run the benchmarks and write the results as JSON")
+    run_parser.add_argument("-o", "--output", default="-", help="file to write the results to (\"-\" for stdout)")
+    run_parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="numbers of states")
+    run_parser.add_argument("--generators", nargs="+", default=list(GENERATORS), choices=list(GENERATORS))
+    run_parser.add_argument("-r", "--repeats", type=int, default=3, help="wall time is the best of this many runs")
+
+    asmd_parser = subparsers.add_parser("asmd", help="time parsing one large synthetic .vhd with the ASMD parser")
+    asmd_parser.add_argument("--states", type=int, default=5000, help="number of states in the generated vhdl")
+    asmd_parser.add_argument("--generator", default="dense_random", choices=list(GENERATORS))
+    asmd_parser.add_argument("--static-lines", type=int, default=0,
+                             help="generate states with this many static lines each, instead of from an FSM")
+    asmd_parser.add_argument("-r", "--repeats", type=int, default=3, help="wall time is the best of this many runs")
+
+    compare_parser = subparsers.add_parser("compare", help="flag regressions between two result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("-t", "--threshold", type=float, default=0.2,
+                                help="allowed slowdown or memory growth, as a fraction of the baseline")
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        results = run(args.sizes, args.generators, args.repeats)
+        if args.output == "-":
+            json.dump(results, sys.stdout, indent=2)
+        else:
+            with open(args.output, "w") as fout:
+                json.dump(results, fout, indent=2)
+        return 0
+
+    if args.command == "asmd":
+        result = bench_asmd(args.states, args.repeats, args.generator, args.static_lines)
+        print(f"Parsed {result['lines']} lines in {result['wall_s']:.3f}s: {result['lines_per_s']:.0f} lines/s, "
+              f"{result['peak_kb']:.0f}KiB peak")
+        return 0
+
+    with open(args.baseline, "r") as fin:
+        baseline = json.load(fin)
+    with open(args.current, "r") as fin:
+        current = json.load(fin)
+    regressions = compare(baseline, current, args.threshold)
+    for regression in regressions:
+        print(regression)
+    print(f"{len(regressions)} regressions over {args.threshold*100:.0f}%")
+    return 0 if len(regressions) == 0 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,64 @@
+""" Generators for synthetic FSM table specs, in the same {'fsm_name', 'table_vals'} format that the web UI posts. """
+from __future__ import annotations
+
+import random
+
+def _table(name: str, num_states: int, num_transitions: int, next_state) -> dict:
+    states = [f"S{i}" for i in range(num_states)]
+    transitions = ["reset"] + [f"t{i}" for i in range(1, num_transitions)]
+    table_vals = [[""] + transitions]
+    for state_idx, state in enumerate(states):
+        table_vals.append([state] + [next_state(state_idx, col_idx) for col_idx in range(num_transitions)])
+    return {"fsm_name": name, "table_vals": table_vals}
+
+def ring(num_states: int, num_transitions: int = 4, seed: int = 0) -> dict:
+    """ Every state resets to S0 and advances to the next state on t1. """
+    def next_state(state_idx, col_idx):
+        if col_idx == 0:
+            return "S0"
+        if col_idx == 1:
+            return f"S{(state_idx + 1) % num_states}"
+        return ""
+    return _table("ring", num_states, num_transitions, next_state)
+
+def dense_random(num_states: int, num_transitions: int = 16, seed: int = 0) -> dict:
+    """ Every transition of every state goes to a random state. """
+    rand = random.Random(seed)
+    return _table("dense_random", num_states, num_transitions, lambda s, c: f"S{rand.randrange(num_states)}")
+
+def sparse_random(num_states: int, num_transitions: int = 16, seed: int = 0) -> dict:
+    """ Every state has about two transitions, to random states. """
+    rand = random.Random(seed)
+    def next_state(state_idx, col_idx):
+        if rand.random() < 2 / num_transitions:
+            return f"S{rand.randrange(num_states)}"
+        return ""
+    return _table("sparse_random", num_states, num_transitions, next_state)
+
+def self_loop_heavy(num_states: int, num_transitions: int = 8, seed: int = 0) -> dict:
+    """ Every state loops back to itself on all but one transition, which advances to the next state. """
+    def next_state(state_idx, col_idx):
+        if col_idx == 1:
+            return f"S{(state_idx + 1) % num_states}"
+        return f"S{state_idx}"
+    return _table("self_loop_heavy", num_states, num_transitions, next_state)
+
+GENERATORS = {
+    "ring": ring,
+    "dense_random": dense_random,
+    "sparse_random": sparse_random,
+    "self_loop_heavy": self_loop_heavy,
+}
+
+def write_static_heavy_vhdl(fout, num_states: int, static_lines: int) -> int:
+    """ Writes a state machine process where every state has a long run of static assignments before its next state
+    assignment, as in hand written designs with many outputs. Returns the number of lines written. """
+    lines = ["entity static_heavy is", "end static_heavy;", "architecture arch of static_heavy is", "begin",
+             "process (state_reg, x)", "begin", "case state_reg is"]
+    for state_idx in range(num_states):
+        lines.append(f"when S{state_idx} =>")
+        lines.extend(f"   out_{line_idx} <= '1';" for line_idx in range(static_lines))
+        lines.append(f"   state_next <= S{(state_idx + 1) % num_states};")
+    lines.extend(["end case;", "end process;", "end arch;"])
+    fout.write("\n".join(lines) + "\n")
+    return len(lines)